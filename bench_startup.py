@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 在子进程中以命令行方式运行 process_excel.py，结束后报告是否导入了 pandas
+RUNNER = (
+    "import sys, runpy\n"
+    "sys.argv = ['process_excel.py'] + sys.argv[1:]\n"
+    "try:\n"
+    "    runpy.run_path('process_excel.py', run_name='__main__')\n"
+    "except SystemExit:\n"
+    "    pass\n"
+    "sys.stderr.write('PANDAS=%d\\n' % ('pandas' in sys.modules))\n"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='测量 process_excel.py 的启动时间和小文件处理耗时')
+    parser.add_argument('--source', help='ERP库存表路径，默认生成一个小的测试文件')
+    parser.add_argument('--target', help='订单表路径，默认生成一个小的测试文件（每次运行都会在其旁边生成带时间戳的输出文件）')
+    parser.add_argument('--rows', type=int, default=200, help='生成测试文件的行数')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测量的重复次数')
+    parser.add_argument('--output', help='把测量结果以JSON格式写入该文件')
+    return parser.parse_args()
+
+
+def make_sample_files(directory, rows):
+    """生成小的ERP库存表（CSV）和订单表（xlsx）"""
+    from openpyxl import Workbook
+
+    source = os.path.join(directory, 'erp.csv')
+    with open(source, 'w', encoding='utf-8-sig') as f:
+        f.write('库存导出,,,\n')
+        f.write('商家编码,商品名称,实际可用数,30天销量\n')
+        for i in range(rows):
+            f.write(f'S-M{i:05d},商品{i},{i % 97},{i % 31}\n')
+
+    target = os.path.join(directory, 'order.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['订单表'])
+    ws.append(['产品型号', '所需数量'])
+    ws.append(['分类', ''])
+    for i in range(rows):
+        ws.append([f'M{i:05d}', None])
+    wb.save(target)
+    return source, target
+
+
+def run(args, repeat):
+    """运行子进程 repeat 次，返回每次的耗时（毫秒）和最后一次的标准错误输出"""
+    timings = []
+    stderr = ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable] + args, cwd=HERE, capture_output=True, text=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(f'命令执行失败: {" ".join(args)}\n{proc.stderr}')
+        stderr = proc.stderr
+    return timings, stderr
+
+
+def summarize(timings):
+    return {'min_ms': round(min(timings), 1), 'median_ms': round(statistics.median(timings), 1)}
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        if args.source and args.target:
+            source, target = args.source, args.target
+        else:
+            source, target = make_sample_files(directory, args.rows)
+
+        results = {}
+        timings, _ = run(['-c', 'import process_excel'], args.repeat)
+        results['import'] = summarize(timings)
+        timings, _ = run(['process_excel.py', '--help'], args.repeat)
+        results['help'] = summarize(timings)
+
+        for name, extra in (('lean', []), ('pandas', ['--lean-max-bytes', '0'])):
+            timings, stderr = run(['-c', RUNNER, source, target] + extra, args.repeat)
+            results[name] = summarize(timings)
+            results[name]['pandas_imported'] = 'PANDAS=1' in stderr
+
+    print(f"源文件: {source}")
+    print(f"目标文件: {target}")
+    print(f"{'项目':<10}{'最短(ms)':>12}{'中位数(ms)':>14}")
+    for name, item in results.items():
+        print(f"{name:<12}{item['min_ms']:>12}{item['median_ms']:>14}")
+    for name in ('lean', 'pandas'):
+        print(f"{name} 模式是否导入 pandas: {'是' if results[name]['pandas_imported'] else '否'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"测量结果已写入: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+
+def extract_model(code):
+    """从商家编码中提取产品型号（取第一个 '-' 之后的部分，去除首尾空格）"""
+    if isinstance(code, str) and '-' in code:
+        parts = code.split('-')
+        if len(parts) >= 2:
+            return '-'.join(parts[1:]).strip()
+    return None
+
+
+def extract_models(df):
+    """从ERP数据的商家编码列提取产品型号，多个编码列按顺序合并"""
+    merchant_code_cols = [col for col in df.columns if '商家' in str(col) and '编码' in str(col)]
+    if not merchant_code_cols:
+        raise ValueError('未在ERP库存表中找到商家编码列')
+    models = df[merchant_code_cols[0]].map(extract_model)
+    for col in merchant_code_cols[1:]:
+        models = models.fillna(df[col].map(extract_model))
+    return models
+
+
+def _to_python(value):
+    if math.isnan(value):
+        return value
+    return int(value) if value.is_integer() else value
+
+
+class ModelIndex:
+    """产品型号索引：型号 -> 一组数值
+
+    型号为驻留字符串，数值按行连续存放在 array('d') 中，
+    内存只与不同型号的数量有关。取值接口与 dict 一致，单列时直接返回数值。
+    """
+
+    def __init__(self, columns=('差值',)):
+        self.columns = tuple(columns)
+        self._positions = {}
+        self._values = array('d')
+
+    @classmethod
+    def from_mapping(cls, mapping, columns=('差值',)):
+        """由 {型号: 数值} 映射构建索引，非字符串型号被忽略"""
+        import pandas as pd
+
+        index = cls(columns)
+        models = pd.Series(list(mapping.keys()), dtype=object)
+        models = models.where(models.map(lambda m: isinstance(m, str)))
+        index.update(models, pd.Series(list(mapping.values()), dtype=object))
+        return index
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, model):
+        return model in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __getitem__(self, model):
+        return self.row(model)[0]
+
+    def get(self, model, default=None):
+        if model not in self._positions:
+            return default
+        return self[model]
+
+    def row(self, model):
+        """返回型号对应的全部列数值"""
+        width = len(self.columns)
+        start = self._positions[model] * width
+        return tuple(_to_python(v) for v in self._values[start:start + width])
+
+    def keys(self):
+        return self._positions.keys()
+
+    def values(self):
+        width = len(self.columns)
+        for position in self._positions.values():
+            yield _to_python(self._values[position * width])
+
+    def items(self):
+        for model in self._positions:
+            yield model, self[model]
+
+    def alias(self, alias_model, model):
+        """让别名型号与已有型号共用同一组数值"""
+        self._positions[alias_model] = self._positions[model]
+
+    def update(self, models, values):
+        """把一批型号和数值并入索引，同一型号以后出现的为准
+
+        models 为型号 Series，values 为与之对齐的 Series（单列）或 DataFrame（多列）。
+        """
+        import pandas as pd
+
+        frame = pd.DataFrame(values)
+        frame.index = models.index
+        mask = models.notna().to_numpy()
+        frame = frame[mask]
+        frame.index = models[mask].to_numpy()
+        frame = frame[~frame.index.duplicated(keep='last')]
+
+        matrix = frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64', na_value=math.nan)
+        for model, row in zip(frame.index, matrix.tolist()):
+            self.put(model, row)
+
+    def put(self, model, row):
+        """写入一个型号的数值（序列长度与列数一致），已存在时覆盖"""
+        width = len(self.columns)
+        position = self._positions.get(model)
+        if position is None:
+            self._positions[sys.intern(model)] = len(self._values) // width
+            self._values.extend(row)
+        else:
+            self._values[position * width:(position + 1) * width] = array('d', row)
+
+
+def build_model_index(chunks, compute_values, columns=('差值',)):
+    """逐块提取产品型号并计算数值，合并成紧凑的型号索引
+
+    compute_values(chunk) 返回与块对齐的 Series 或 DataFrame，列顺序与 columns 一致。
+    """
+    index = ModelIndex(columns)
+    for chunk in chunks:
+        index.update(extract_models(chunk), compute_values(chunk))
+    return index
+
+
+def build_model_index_from_records(records, compute_values, columns=('差值',)):
+    """不依赖 pandas 的建索引方式，适合小文件
+
+    records 逐行产出 {列名: 值}；compute_values(record) 返回单个数值或与 columns 对应的数值序列。
+    """
+    index = ModelIndex(columns)
+    code_columns = None
+    for record in records:
+        if code_columns is None:
+            code_columns = [name for name in record if '商家' in name and '编码' in name]
+            if not code_columns:
+                raise ValueError('未在ERP库存表中找到商家编码列')
+        model = None
+        for name in code_columns:
+            model = extract_model(record.get(name))
+            if model is not None:
+                break
+        if model is None:
+            continue
+        values = compute_values(record)
+        row = values if isinstance(values, (tuple, list)) else (values,)
+        index.put(model, [float(v) if isinstance(v, (int, float)) else math.nan for v in row])
+    return index
+
+
+# 共享索引文件格式（小端）：
+#   文件头 | 列名(JSON) | 键偏移 uint64[n+1] | 键对应行号 uint32[n] | 数值 float64[行数*列数] | 哈希槽 uint32[槽数]
+# 键按字典序排列；哈希槽存放 键序号+1（0 表示空槽），线性探测。
+INDEX_MAGIC = b'ERPIDX01'
+# 文件头中的格式版本。版本 2 起差值统一为 30天销量 - 实际可用数；
+# 版本 1 由旧版命令行发布，差值为 实际可用数 - 30天销量，不能直接使用，须用当前版本重新发布
+INDEX_FORMAT = 2
+_INDEX_HEADER = struct.Struct('<8sIIQQQQQQQQQ')
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def _slot_hash(key_bytes):
+    return zlib.crc32(key_bytes)
+
+
+def is_index_file(path):
+    """判断文件是否为共享型号索引文件"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(INDEX_MAGIC)) == INDEX_MAGIC
+    except OSError:
+        return False
+
+
+def read_index_version(path):
+    """读取索引文件的快照版本号，文件不存在时返回 0"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_INDEX_HEADER.size)
+    except OSError:
+        return 0
+    if len(header) < _INDEX_HEADER.size or not header.startswith(INDEX_MAGIC):
+        return 0
+    return _INDEX_HEADER.unpack(header)[4]
+
+
+def publish_index(index, path, version=None):
+    """把型号索引写成共享索引文件，供多个进程只读映射
+
+    先写临时文件再原子替换，已映射旧版本的进程不受影响，重新映射后即读到新快照。
+    version 默认为现有文件版本号加 1。返回写入的版本号。
+    """
+    if version is None:
+        version = read_index_version(path) + 1
+    width = len(index.columns)
+    columns_blob = json.dumps(list(index.columns), ensure_ascii=False).encode('utf-8')
+
+    keys = sorted(index.keys())
+    encoded = [key.encode('utf-8') for key in keys]
+    offsets = array('Q', [0])
+    for key_bytes in encoded:
+        offsets.append(offsets[-1] + len(key_bytes))
+    key_blob = b''.join(encoded)
+
+    # 别名与原型号共用一行数值，行号沿用 ModelIndex 中的位置
+    row_of_key = array('I', (index._positions[key] for key in keys))
+    row_count = len(index._values) // width if width else 0
+
+    table_size = 1
+    while table_size < max(8, len(keys) * 2):
+        table_size *= 2
+    table = array('I', bytes(4 * table_size))
+    mask = table_size - 1
+    for key_index, key_bytes in enumerate(encoded):
+        slot = _slot_hash(key_bytes) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = key_index + 1
+
+    columns_pos = _align(_INDEX_HEADER.size)
+    offsets_pos = _align(columns_pos + len(columns_blob))
+    rows_pos = _align(offsets_pos + offsets.itemsize * len(offsets))
+    values_pos = _align(rows_pos + row_of_key.itemsize * len(row_of_key))
+    table_pos = _align(values_pos + 8 * len(index._values))
+    blob_pos = _align(table_pos + table.itemsize * len(table))
+
+    header = _INDEX_HEADER.pack(
+        INDEX_MAGIC, INDEX_FORMAT, width, len(keys), version, row_count, table_size,
+        columns_pos, len(columns_blob), offsets_pos, values_pos, table_pos,
+    )
+    sections = [
+        (0, header), (columns_pos, columns_blob), (offsets_pos, offsets.tobytes()),
+        (rows_pos, row_of_key.tobytes()), (values_pos, index._values.tobytes()),
+        (table_pos, table.tobytes()), (blob_pos, key_blob),
+    ]
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for position, data in sections:
+            f.write(bytes(position - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, path)
+    return version
+
+
+class MappedModelIndex:
+    """只读映射的共享型号索引，接口与 ModelIndex 一致
+
+    多个进程映射同一文件时共用操作系统页缓存，不复制数据。
+    别名只记录在当前对象中，不写回共享文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._identity = (stat.st_ino, stat.st_mtime_ns)
+        (magic, index_format, width, count, version, row_count, table_size,
+         columns_pos, columns_len, offsets_pos, values_pos, table_pos) = _INDEX_HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC:
+            self._mm.close()
+            raise ValueError(f'不是有效的型号索引文件: {path}')
+        if index_format != INDEX_FORMAT:
+            self._mm.close()
+            raise ValueError(f'型号索引文件 {path} 的格式版本为 {index_format}，当前需要 {INDEX_FORMAT}'
+                             f'（旧版本发布的差值符号与当前相反），请重新发布共享索引')
+
+        view = memoryview(self._mm)
+        self.version = version
+        self.columns = tuple(json.loads(bytes(view[columns_pos:columns_pos + columns_len]).decode('utf-8')))
+        self._count = count
+        self._offsets = view[offsets_pos:offsets_pos + 8 * (count + 1)].cast('Q')
+        rows_pos = _align(offsets_pos + 8 * (count + 1))
+        self._rows = view[rows_pos:rows_pos + 4 * count].cast('I')
+        self._values = view[values_pos:values_pos + 8 * row_count * width].cast('d')
+        self._table = view[table_pos:table_pos + 4 * table_size].cast('I')
+        blob_pos = _align(table_pos + 4 * table_size)
+        self._blob = view[blob_pos:]
+        self._mask = table_size - 1
+        self._aliases = {}
+
+    def view(self):
+        """返回共用同一映射、别名相互独立的新对象"""
+        clone = object.__new__(MappedModelIndex)
+        clone.__dict__.update(self.__dict__)
+        clone._aliases = {}
+        return clone
+
+    def is_stale(self):
+        """索引文件已被新快照替换时返回 True"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self._identity
+
+    def _key(self, key_index):
+        return bytes(self._blob[self._offsets[key_index]:self._offsets[key_index + 1]]).decode('utf-8')
+
+    def _find_row(self, model):
+        if model in self._aliases:
+            return self._aliases[model]
+        if not isinstance(model, str):
+            return None
+        key_bytes = model.encode('utf-8')
+        slot = _slot_hash(key_bytes) & self._mask
+        while True:
+            entry = self._table[slot]
+            if not entry:
+                return None
+            key_index = entry - 1
+            if self._blob[self._offsets[key_index]:self._offsets[key_index + 1]] == key_bytes:
+                return self._rows[key_index]
+            slot = (slot + 1) & self._mask
+
+    def __len__(self):
+        return self._count + len(self._aliases)
+
+    def __contains__(self, model):
+        return self._find_row(model) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, model):
+        row = self._find_row(model)
+        if row is None:
+            raise KeyError(model)
+        return _to_python(self._values[row * len(self.columns)])
+
+    def get(self, model, default=None):
+        row = self._find_row(model)
+        if row is None:
+            return default
+        return _to_python(self._values[row * len(self.columns)])
+
+    def row(self, model):
+        row = self._find_row(model)
+        if row is None:
+            raise KeyError(model)
+        width = len(self.columns)
+        return tuple(_to_python(v) for v in self._values[row * width:(row + 1) * width])
+
+    def keys(self):
+        return [self._key(i) for i in range(self._count)] + list(self._aliases)
+
+    def values(self):
+        width = len(self.columns)
+        for key_index in range(self._count):
+            yield _to_python(self._values[self._rows[key_index] * width])
+        for row in self._aliases.values():
+            yield _to_python(self._values[row * width])
+
+    def items(self):
+        for model in self.keys():
+            yield model, self[model]
+
+    def alias(self, alias_model, model):
+        self._aliases[alias_model] = self._find_row(model)
+
+
+def attach_index(path, current=None):
+    """映射共享索引文件；current 仍是最新快照时直接返回它"""
+    if current is not None and current.path == path and not current.is_stale():
+        return current
+    return MappedModelIndex(path)
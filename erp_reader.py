@@ -0,0 +1,242 @@
+import csv
+import io
+import math
+
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+SNIFF_SIZE = 64 * 1024
+
+# ERP 库存表中实际用到的列
+ERP_REQUIRED_COLUMNS = ('实际可用数', '30天销量')
+
+
+def is_erp_column(name):
+    """判断ERP库存表的列是否需要读取（商家编码列和数量列）"""
+    name = str(name)
+    return ('商家' in name and '编码' in name) or name in ERP_REQUIRED_COLUMNS
+
+
+def _read_head(source, size=SNIFF_SIZE):
+    if hasattr(source, 'read'):
+        position = source.tell()
+        head = source.read(size)
+        source.seek(position)
+        return head
+    with open(source, 'rb') as f:
+        return f.read(size)
+
+
+def sniff_format(head):
+    """根据文件头部字节判断格式：xlsx、xls 或 csv"""
+    if head.startswith(ZIP_MAGIC):
+        return 'xlsx'
+    if head.startswith(OLE_MAGIC):
+        return 'xls'
+    return 'csv'
+
+
+def detect_encoding(head):
+    """判断文本编码：带 BOM 或可按 UTF-8 解码的视为 UTF-8，否则按 GBK（GB18030）处理"""
+    if head.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    try:
+        head.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # 采样截断在多字节字符中间时不算解码失败
+        if e.start >= len(head) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8'
+    return 'gb18030'
+
+
+def _csv_dialect(text):
+    try:
+        return csv.Sniffer().sniff(text, delimiters=',\t;|').delimiter
+    except csv.Error:
+        return ','
+
+
+def _csv_options(head, header, usecols):
+    """根据采样内容确定CSV的编码、分隔符和需要读取的列"""
+    encoding = detect_encoding(head)
+    sample = head.decode(encoding, errors='ignore')
+    delimiter = _csv_dialect(sample)
+
+    # 先从采样中解析列名，把列筛选函数转换成列名列表（pyarrow 引擎不支持函数形式）
+    options = dict(header=header, encoding=encoding, sep=delimiter)
+    if usecols is not None:
+        sample_rows = list(csv.reader(io.StringIO(sample), delimiter=delimiter))
+        if len(sample_rows) > header:
+            columns = [name for name in sample_rows[header] if usecols(name)]
+            if columns:
+                options['usecols'] = columns
+    return options
+
+
+def read_erp_table(source, header=1, usecols=is_erp_column):
+    """读取ERP库存表，按文件内容而非扩展名选择解析方式
+
+    source 可以是文件路径或二进制文件对象（如上传的文件）。
+    header 为列名所在行（从0开始），usecols 为列筛选函数，传 None 读取全部列。
+    """
+    import pandas as pd
+
+    head = _read_head(source)
+    file_format = sniff_format(head)
+
+    if file_format == 'xlsx':
+        return pd.read_excel(source, header=header, usecols=usecols, engine='openpyxl')
+    if file_format == 'xls':
+        return pd.read_excel(source, header=header, usecols=usecols, engine='xlrd')
+
+    read_kwargs = _csv_options(head, header, usecols)
+    try:
+        import pyarrow  # noqa: F401
+        read_kwargs['engine'] = 'pyarrow'
+    except ImportError:
+        pass
+
+    if hasattr(source, 'read'):
+        source.seek(0)
+    try:
+        return pd.read_csv(source, **read_kwargs)
+    except ValueError:
+        if read_kwargs.get('engine') != 'pyarrow':
+            raise
+        # pyarrow 引擎对不规则文件较严格，回退到默认解析器
+        if hasattr(source, 'read'):
+            source.seek(0)
+        read_kwargs.pop('engine')
+        return pd.read_csv(source, **read_kwargs)
+
+
+def iter_erp_chunks(source, header=1, usecols=is_erp_column, chunksize=50000):
+    """分块读取ERP库存表，每次产出不超过 chunksize 行的 DataFrame
+
+    CSV 和 xlsx 按行流式读取，内存只与块大小有关；xls 格式无法流式解析，整表读取后再分块。
+    """
+    import pandas as pd
+
+    head = _read_head(source)
+    file_format = sniff_format(head)
+
+    if file_format == 'csv':
+        if hasattr(source, 'read'):
+            source.seek(0)
+        with pd.read_csv(source, chunksize=chunksize, **_csv_options(head, header, usecols)) as reader:
+            yield from reader
+        return
+
+    if file_format == 'xls':
+        df = read_erp_table(source, header=header, usecols=usecols)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+        return
+
+    wb = _load_xlsx(source)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        for _ in range(header):
+            next(rows, None)
+        names = [str(v) if v is not None else f'Unnamed: {i}' for i, v in enumerate(next(rows, ()))]
+        keep = [i for i, name in enumerate(names) if usecols is None or usecols(name)]
+        columns = [names[i] for i in keep]
+        batch = []
+        for row in rows:
+            batch.append([row[i] if i < len(row) else None for i in keep])
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        wb.close()
+
+
+def _load_xlsx(source):
+    # openpyxl 按扩展名拒绝路径形式的 .csv 文件，统一以文件对象打开
+    from openpyxl import load_workbook
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as f:
+            source = io.BytesIO(f.read())
+    return load_workbook(source, read_only=True, data_only=True)
+
+
+def _is_code_column(name):
+    return '商家' in name and '编码' in name
+
+
+def _to_number(value):
+    """把数量列的单元格转换为数值，空值转为 NaN，无法转换的文本原样返回"""
+    if value is None or value == '':
+        return math.nan
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return value
+
+
+def iter_erp_records(source, header=1, usecols=is_erp_column):
+    """不依赖 pandas 逐行读取ERP库存表，产出 {列名: 值}
+
+    用于小文件的快速路径：编码列保留原值，其余列转换为数值。
+    """
+    head = _read_head(source)
+    file_format = sniff_format(head)
+
+    if file_format == 'csv':
+        encoding = detect_encoding(head)
+        delimiter = _csv_dialect(head.decode(encoding, errors='ignore'))
+        if hasattr(source, 'read'):
+            source.seek(0)
+            text = io.TextIOWrapper(source, encoding=encoding, newline='')
+        else:
+            text = open(source, 'r', encoding=encoding, newline='')
+        try:
+            rows = csv.reader(text, delimiter=delimiter)
+            yield from _rows_to_records(rows, header, usecols)
+        finally:
+            if hasattr(source, 'read'):
+                text.detach()
+            else:
+                text.close()
+    elif file_format == 'xls':
+        import xlrd
+        if hasattr(source, 'read'):
+            book = xlrd.open_workbook(file_contents=source.read())
+        else:
+            book = xlrd.open_workbook(source)
+        sheet = book.sheet_by_index(0)
+        yield from _rows_to_records((sheet.row_values(i) for i in range(sheet.nrows)), header, usecols)
+    else:
+        wb = _load_xlsx(source)
+        try:
+            yield from _rows_to_records(wb.worksheets[0].iter_rows(values_only=True), header, usecols)
+        finally:
+            wb.close()
+
+
+def _rows_to_records(rows, header, usecols):
+    rows = iter(rows)
+    for _ in range(header):
+        next(rows, None)
+    names = [str(v).strip() if v is not None else '' for v in next(rows, ())]
+    keep = [(i, name, _is_code_column(name)) for i, name in enumerate(names)
+            if name and (usecols is None or usecols(name))]
+    for row in rows:
+        record = {}
+        for i, name, is_code in keep:
+            value = row[i] if i < len(row) else None
+            record[name] = value if is_code else _to_number(value)
+        yield record
+
+
+def describe_source(source):
+    """返回ERP库存表的实际格式，用于日志输出"""
+    head = _read_head(source)
+    file_format = sniff_format(head)
+    if file_format == 'csv':
+        return f'csv ({detect_encoding(head)})'
+    return file_format
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from erp_reader import iter_erp_chunks, is_erp_column
+from erp_index import ModelIndex, extract_models
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+SNAPSHOT_TABLE = 'erp_inventory'
+MODEL_COLUMN = '产品型号'
+# SQLite 单条语句的参数个数有上限，IN 查询按批执行
+QUERY_BATCH = 500
+
+# 每个快照文件最多保留的空闲连接数
+POOL_SIZE = 4
+
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def is_erp_snapshot(path):
+    """判断文件是否为 SQLite 格式的ERP快照"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError:
+        return False
+
+
+def _sql_value(value):
+    if value is None or value != value:
+        return None
+    if isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+def _sql_columns(df):
+    """按列转换为 SQLite 可直接写入的值：空值为 None，日期等其他类型转为文本"""
+    from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if is_numeric_dtype(series) and not is_bool_dtype(series):
+            columns.append(series.astype(object).where(series.notna(), None).tolist())
+        else:
+            columns.append([_sql_value(v) for v in series.tolist()])
+    return columns
+
+
+def land_erp_snapshot(source, db_path, chunksize=50000):
+    """把ERP导出落地为 SQLite 快照，返回产品型号数量
+
+    保留导出中的全部列，每个产品型号一行（同一型号以后出现的为准），型号为主键。
+    先写入临时文件再原子替换，正在查询旧快照的进程不受影响。
+    """
+    tmp_path = f'{db_path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # 临时文件写完才替换正式快照，无需日志
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        columns = None
+        for chunk in iter_erp_chunks(source, header=1, usecols=None, chunksize=chunksize):
+            models = extract_models(chunk)
+            chunk = chunk.drop(columns=[MODEL_COLUMN], errors='ignore')
+            if columns is None:
+                columns = [str(col) for col in chunk.columns]
+                conn.execute(
+                    f'CREATE TABLE {SNAPSHOT_TABLE} ({_quote(MODEL_COLUMN)} TEXT PRIMARY KEY, '
+                    + ', '.join(_quote(col) for col in columns) + ') WITHOUT ROWID'
+                )
+                insert = (f'INSERT OR REPLACE INTO {SNAPSHOT_TABLE} VALUES '
+                          f'({", ".join("?" * (len(columns) + 1))})')
+            mask = models.notna()
+            conn.executemany(insert, zip(models[mask].tolist(), *_sql_columns(chunk[mask])))
+        if columns is None:
+            raise ValueError('ERP库存表中没有数据')
+
+        count = conn.execute(f'SELECT COUNT(*) FROM {SNAPSHOT_TABLE}').fetchone()[0]
+        source_name = source if isinstance(source, str) else getattr(source, 'name', '')
+        conn.execute('CREATE TABLE snapshot_meta (key TEXT PRIMARY KEY, value TEXT)')
+        conn.executemany('INSERT INTO snapshot_meta VALUES (?, ?)', [
+            ('source', os.path.basename(str(source_name))),
+            ('landed_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            ('models', str(count)),
+            ('columns', json.dumps(columns, ensure_ascii=False)),
+        ])
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+@contextmanager
+def connection(db_path):
+    """从按路径区分的连接池中借出只读连接，用完归还
+
+    连接池在进程内共用，Streamlit 每次运行脚本的线程不同，按线程保存连接无法复用。
+    借出期间连接只由一个线程使用；快照文件被替换后，连向旧文件的空闲连接在下次借出时关闭并重新连接。
+    """
+    path = os.path.abspath(db_path)
+    stat = os.stat(path)
+    identity = (stat.st_ino, stat.st_mtime_ns)
+    conn = None
+    with _pool_lock:
+        idle = _pool.setdefault(path, [])
+        while idle:
+            candidate, conn_identity = idle.pop()
+            if conn_identity == identity:
+                conn = candidate
+                break
+            candidate.close()
+    if conn is None:
+        conn = sqlite3.connect(f'{Path(path).as_uri()}?mode=ro', uri=True, check_same_thread=False)
+    try:
+        yield conn
+    finally:
+        with _pool_lock:
+            idle = _pool.setdefault(path, [])
+            if len(idle) < POOL_SIZE:
+                idle.append((conn, identity))
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def snapshot_info(db_path):
+    """返回快照的元信息：来源文件、落地时间、型号数量、列名"""
+    with connection(db_path) as conn:
+        info = dict(conn.execute('SELECT key, value FROM snapshot_meta'))
+    info['models'] = int(info.get('models', 0))
+    info['columns'] = json.loads(info.get('columns', '[]'))
+    return info
+
+
+def snapshot_models(db_path):
+    """返回快照中的全部产品型号（只扫描主键）"""
+    with connection(db_path) as conn:
+        return [row[0] for row in conn.execute(f'SELECT {_quote(MODEL_COLUMN)} FROM {SNAPSHOT_TABLE}')]
+
+
+def fetch_erp_rows(db_path, models, usecols=is_erp_column):
+    """按产品型号查询快照，只取给定的型号
+
+    通过主键分批 IN 查询，耗时与 models 数量成正比，与库存总量无关。
+    usecols 为列筛选函数，传 None 取全部列。返回 (列名列表, 行列表)，每行第一列为产品型号。
+    """
+    models = list(dict.fromkeys(m for m in models if isinstance(m, str)))
+    rows = []
+    with connection(db_path) as conn:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({SNAPSHOT_TABLE})')][1:]
+        if usecols is not None:
+            columns = [col for col in columns if usecols(col)]
+        select = ', '.join(_quote(col) for col in [MODEL_COLUMN] + columns)
+        for start in range(0, len(models), QUERY_BATCH):
+            batch = models[start:start + QUERY_BATCH]
+            rows.extend(conn.execute(
+                f'SELECT {select} FROM {SNAPSHOT_TABLE} '
+                f'WHERE {_quote(MODEL_COLUMN)} IN ({", ".join("?" * len(batch))})',
+                batch
+            ))
+    return [MODEL_COLUMN] + columns, rows
+
+
+def load_snapshot_index(db_path, models, compute_values, columns=('差值',), usecols=is_erp_column):
+    """查询给定型号并计算数值，返回 ModelIndex
+
+    compute_values 与 build_model_index 相同：接收 DataFrame，返回 Series 或 DataFrame。
+    """
+    import pandas as pd
+
+    names, rows = fetch_erp_rows(db_path, models, usecols)
+    df = pd.DataFrame(rows, columns=names)
+    # 数量列在快照中可能混有空值，转换为浮点数以便按列计算
+    for col in names[1:]:
+        if df[col].map(lambda v: v is None or isinstance(v, (int, float))).all():
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    index = ModelIndex(columns)
+    if len(df):
+        index.update(df[MODEL_COLUMN], compute_values(df))
+    return index
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='把ERP库存表落地为 SQLite 快照，供订单表按型号直接查询')
+    parser.add_argument('source_file', help='ERP库存表路径（xlsx / xls / csv）')
+    parser.add_argument('db_file', help='SQLite 快照路径，已存在时原子替换')
+    parser.add_argument('--chunksize', type=int, default=50000, help='分块读取ERP库存表的每块行数')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"读取ERP库存表: {args.source_file}")
+    try:
+        count = land_erp_snapshot(args.source_file, args.db_file, chunksize=args.chunksize)
+    except (OSError, ValueError) as e:
+        print(f"落地失败: {e}")
+        return 1
+    print(f"已写入ERP快照: {args.db_file}（共 {count} 个产品型号）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,13 +2,17 @@ import streamlit as st
 import pandas as pd
 import openpyxl
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.utils.dataframe import dataframe_to_rows
 from io import BytesIO
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from difflib import SequenceMatcher
-import xlrd
 from copy import copy
-import tempfile
+from template_registry import find_template, remember_template
+from sheet_range import used_range
+from source_reader import read_preview, read_source_columns
 
 st.set_page_config(page_title="Excel数据回填工具", layout="wide")
 
@@ -30,6 +34,23 @@ def detect_data_start_row(df, header_row):
             return i
     return header_row + 1
 
+def locate_header_row(df, labels):
+    """在预览窗口中找出与主源文件表头重合最多的行作为表头行，都不重合时按非空比例识别"""
+    labels = {str(label).strip() for label in labels if pd.notna(label)}
+    best_row, best_hits = None, 0
+    for i in range(len(df)):
+        hits = sum(1 for value in df.iloc[i] if pd.notna(value) and str(value).strip() in labels)
+        if hits > best_hits:
+            best_row, best_hits = i, hits
+    return best_row if best_row is not None else detect_header_row(df)
+
+def header_positions(headers):
+    """列映射选项的显示名 -> 列位置，同名列取第一个"""
+    positions = {}
+    for i, c in enumerate(headers):
+        positions.setdefault((str(c) if pd.notna(c) else f"列{i}").strip(), i)
+    return positions
+
 def similarity(a, b):
     if pd.isna(a) or pd.isna(b):
         return 0
@@ -82,7 +103,18 @@ def auto_match_columns(source_cols, target_cols):
     
     return mapping
 
+def get_template_rows(source_df, target_df, source_header_row, target_header_row):
+    """取源文件和目标模板的表头区域，用于计算模板指纹"""
+    rows = source_df.iloc[:source_header_row + 1].values.tolist()
+    rows.append(['<target>'])
+    rows.extend(target_df.iloc[:target_header_row + 1].values.tolist())
+    return rows
+
 def xls_to_xlsx_from_bytes(file_bytes):
+    # 只有 .xls 文件才需要 xlrd，按需导入以加快应用启动
+    import tempfile
+    import xlrd
+
     with tempfile.NamedTemporaryFile(suffix='.xls', delete=False) as tmp:
         tmp.write(file_bytes)
         tmp_path = tmp.name
@@ -142,42 +174,229 @@ def xls_to_xlsx_from_bytes(file_bytes):
     finally:
         os.unlink(tmp_path)
 
-def load_excel_from_uploaded(uploaded_file):
-    file_bytes = uploaded_file.read()
-    file_name = uploaded_file.name
+def copy_cell_streaming(ws, source_cell, value):
+    """按模板单元格的样式、批注和超链接生成只写单元格"""
+    from openpyxl.cell import WriteOnlyCell
+    
+    cell = WriteOnlyCell(ws, value=value)
+    if source_cell.has_style:
+        cell.font = copy(source_cell.font)
+        cell.fill = copy(source_cell.fill)
+        cell.border = copy(source_cell.border)
+        cell.alignment = copy(source_cell.alignment)
+        cell.protection = copy(source_cell.protection)
+        cell.number_format = source_cell.number_format
+    if source_cell.comment is not None:
+        cell.comment = copy(source_cell.comment)
+    if source_cell.hyperlink is not None:
+        cell.hyperlink = copy(source_cell.hyperlink)
+    return cell
+
+def copy_sheet_setup(source_ws, ws, max_row=None):
+    """复制只写工作表支持的工作表级设置
+
+    包括列宽、视图（冻结窗格、缩放）、图片、表格、数据验证、条件格式、自动筛选、打印设置、
+    页眉页脚、分页符、工作表保护和标签颜色。行高和合并单元格只复制第 max_row 行以内的部分，None 为全部。
+    """
+    from copy import deepcopy
+    
+    for key, dim in source_ws.column_dimensions.items():
+        ws.column_dimensions[key].width = dim.width
+        ws.column_dimensions[key].hidden = dim.hidden
+    for row_idx, dim in source_ws.row_dimensions.items():
+        if dim.height and (max_row is None or row_idx <= max_row):
+            ws.row_dimensions[row_idx].height = dim.height
+    for merged in source_ws.merged_cells.ranges:
+        if max_row is None or merged.max_row <= max_row:
+            ws.merged_cells.add(copy(merged))
+    
+    ws.sheet_state = source_ws.sheet_state
+    ws.sheet_properties = copy(source_ws.sheet_properties)
+    ws.sheet_format = deepcopy(source_ws.sheet_format)
+    ws.views = deepcopy(source_ws.views)
+    ws.protection = copy(source_ws.protection)
+    for image in getattr(source_ws, '_images', []):
+        ws.add_image(image)
+    for table in source_ws.tables.values():
+        ws.add_table(copy(table))
+    
+    # 数据验证和条件格式的区域与模板一致，与普通模式下保留的范围相同
+    for validation in source_ws.data_validations.dataValidation:
+        ws.data_validations.append(copy(validation))
+    for formatting in source_ws.conditional_formatting:
+        for rule in formatting.rules:
+            ws.conditional_formatting.add(str(formatting.sqref), copy(rule))
+    ws.auto_filter = deepcopy(source_ws.auto_filter)
+    
+    for name in source_ws.page_setup.__attrs__:
+        setattr(ws.page_setup, name, getattr(source_ws.page_setup, name))
+    ws.print_options = copy(source_ws.print_options)
+    ws.page_margins = copy(source_ws.page_margins)
+    ws.HeaderFooter = deepcopy(source_ws.HeaderFooter)
+    ws.row_breaks = deepcopy(source_ws.row_breaks)
+    ws.col_breaks = deepcopy(source_ws.col_breaks)
+    ws.print_title_rows = source_ws.print_title_rows
+    ws.print_title_cols = source_ws.print_title_cols
+    if source_ws.print_area:
+        ws.print_area = [ref.split('!')[-1] for ref in source_ws.print_area.split(',')]
+    for name, defined in source_ws.defined_names.items():
+        ws.defined_names[name] = copy(defined)
+
+def fill_template_streaming(template_ws, header_rows, data_rows):
+    """流式填充模板：表头行和列样式只复制一次，数据行通过只写工作表逐行追加
+
+    header_rows 为表头所占行数，模板第 header_rows + 1 行的样式作为数据行样式；
+    data_rows 逐行产出 {列号: 值}。模板工作簿中的其他工作表和工作簿级名称原样复制。
+    返回 (只写工作簿, 写入行数)。
+    """
+    from openpyxl.cell import WriteOnlyCell
+    
+    template_wb = template_ws.parent
+    wb = openpyxl.Workbook(write_only=True)
+    row_count = 0
+    for source_ws in template_wb.worksheets:
+        ws = wb.create_sheet(title=source_ws.title)
+        if source_ws is not template_ws:
+            copy_sheet_setup(source_ws, ws)
+            for row in source_ws.iter_rows():
+                ws.append([copy_cell_streaming(ws, cell, cell.value) for cell in row])
+            continue
+        
+        copy_sheet_setup(template_ws, ws, max_row=header_rows)
+        # 只复制实际有数据的列，整列设置过格式的模板不会让每行都写出上万个单元格
+        max_col = max(used_range(template_ws)[1], 1)
+        for row_idx in range(1, header_rows + 1):
+            ws.append([copy_cell_streaming(ws, template_ws.cell(row=row_idx, column=col_idx),
+                                           template_ws.cell(row=row_idx, column=col_idx).value)
+                       for col_idx in range(1, max_col + 1)])
+        
+        # 数据行样式只在新工作簿中登记一次，之后每个单元格直接复用样式索引
+        style_row = header_rows + 1
+        data_styles = [copy(copy_cell_streaming(ws, template_ws.cell(row=style_row, column=col_idx), None)._style)
+                       for col_idx in range(1, max_col + 1)]
+        data_dim = template_ws.row_dimensions.get(style_row)
+        if data_dim is not None and data_dim.height:
+            ws.sheet_format.defaultRowHeight = data_dim.height
+            ws.sheet_format.customHeight = True
+        
+        for values in data_rows:
+            width = max(max_col, max(values, default=0))
+            row = []
+            for col_idx in range(1, width + 1):
+                cell = WriteOnlyCell(ws, value=values.get(col_idx))
+                if col_idx <= max_col:
+                    cell._style = copy(data_styles[col_idx - 1])
+                row.append(cell)
+            ws.append(row)
+            row_count += 1
     
+    for name, defined in template_wb.defined_names.items():
+        wb.defined_names[name] = copy(defined)
+    wb.active = template_wb.worksheets.index(template_ws)
+    return wb, row_count
+
+# 配置界面只读取文件前若干行，完整数据在执行导入时才读取
+PREVIEW_ROWS = 50
+
+def load_workbook_from_bytes(file_bytes, file_name):
     if file_name.endswith('.xls'):
-        df = pd.read_excel(BytesIO(file_bytes), header=None, engine='xlrd')
-        wb = xls_to_xlsx_from_bytes(file_bytes)
-    else:
-        df = pd.read_excel(BytesIO(file_bytes), header=None)
-        wb = openpyxl.load_workbook(BytesIO(file_bytes))
+        return xls_to_xlsx_from_bytes(file_bytes)
+    return openpyxl.load_workbook(BytesIO(file_bytes))
+
+def load_excel_from_uploaded(uploaded_file):
+    file_bytes = uploaded_file.getvalue()
+    df, total_rows = read_preview(file_bytes, uploaded_file.name, PREVIEW_ROWS)
+    return df, file_bytes, total_rows
+
+@st.cache_resource
+def read_pool():
+    """读取源文件的进程池，所有会话共用，工作进程启动后一直复用
+
+    用 spawn 启动：在多线程的 Streamlit 服务进程中 fork 可能死锁。
+    """
+    return ProcessPoolExecutor(max_workers=min(8, os.cpu_count() or 1), mp_context=multiprocessing.get_context('spawn'))
+
+def run_reads(fn, jobs):
+    """在进程池中执行读取任务，按任务顺序返回 [(结果, 异常)]；只有一个任务时直接在当前进程执行，省去进程间传递数据"""
+    if len(jobs) == 1:
+        try:
+            return [(fn(*jobs[0]), None)]
+        except Exception as e:
+            return [(None, e)]
+    pool = read_pool()
+    try:
+        futures = [pool.submit(fn, *job) for job in jobs]
+    except BrokenProcessPool:
+        read_pool.clear()
+        raise
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append((future.result(), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    if any(isinstance(e, BrokenProcessPool) for _, e in outcomes):
+        # 工作进程异常退出后进程池不可再用，下次读取时重新创建
+        read_pool.clear()
+    return outcomes
+
+def load_extra_sources(uploaded_files, cached):
+    """在多个进程中读取其他源文件的预览窗口，已读取过的文件直接复用，返回 (源文件列表, 错误列表)"""
+    keys = [getattr(f, 'file_id', f.name) for f in uploaded_files]
+    new_files = [(f, key) for f, key in zip(uploaded_files, keys) if key not in cached]
+    outcomes = run_reads(read_preview, [(f.getvalue(), f.name, PREVIEW_ROWS) for f, _ in new_files])
+    loaded = {key: outcome for (_, key), outcome in zip(new_files, outcomes)}
     
-    return df, wb
+    sources, errors = [], []
+    for uploaded_file, key in zip(uploaded_files, keys):
+        if key in cached:
+            sources.append(cached[key])
+            continue
+        result, error = loaded[key]
+        if error is not None:
+            errors.append(f"{uploaded_file.name}: {error}")
+            continue
+        df, total_rows = result
+        sources.append({'key': key, 'name': uploaded_file.name, 'df': df, 'bytes': uploaded_file.getvalue(),
+                        'rows': total_rows})
+    return sources, errors
 
 col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("源文件设置")
-    source_file = st.file_uploader(
-        "上传源文件",
+    source_files = st.file_uploader(
+        "上传源文件（可多选，按第一个文件配置表头和列映射）",
         type=['xlsx', 'xls'],
-        key="source_uploader"
+        key="source_uploader",
+        accept_multiple_files=True
     )
+    source_file = source_files[0] if source_files else None
+    
+    # 其他源文件共用第一个文件的列映射，各自识别表头位置
+    extra_files = source_files[1:] if source_files else []
+    extra_keys = [getattr(f, 'file_id', f.name) for f in extra_files]
+    if [source['key'] for source in st.session_state.get('extra_sources', [])] != extra_keys:
+        cached = {source['key']: source for source in st.session_state.get('extra_sources', [])}
+        st.session_state['extra_sources'], extra_errors = load_extra_sources(extra_files, cached)
+        for error in extra_errors:
+            st.error(f"加载失败: {error}")
     
     if source_file is not None:
         try:
-            source_df, source_wb = load_excel_from_uploaded(source_file)
-            st.session_state['source_df'] = source_df
-            st.session_state['source_wb'] = source_wb
+            source_key = getattr(source_file, 'file_id', source_file.name)
+            if st.session_state.get('source_key') != source_key:
+                source_df, source_bytes, source_rows = load_excel_from_uploaded(source_file)
+                st.session_state['source_df'] = source_df
+                st.session_state['source_bytes'] = source_bytes
+                st.session_state['source_name'] = source_file.name
+                st.session_state['source_rows'] = source_rows
+                st.session_state['source_key'] = source_key
             
-            auto_header = detect_header_row(source_df)
-            st.session_state['auto_header_row'] = auto_header
-            
-            auto_data_start = detect_data_start_row(source_df, auto_header)
-            st.session_state['auto_data_start'] = auto_data_start
-            
-            st.success(f"加载成功！共 {len(source_df)} 行，{len(source_df.columns)} 列")
+            st.success(f"加载成功！共 {st.session_state['source_rows']} 行，{len(st.session_state['source_df'].columns)} 列")
+            if st.session_state.get('extra_sources'):
+                st.info(f"另有 {len(st.session_state['extra_sources'])} 个源文件，共 "
+                        f"{sum(source['rows'] for source in st.session_state['extra_sources'])} 行")
         except Exception as e:
             st.error(f"加载失败: {e}")
 
@@ -191,16 +410,49 @@ with col2:
     
     if target_file is not None:
         try:
-            target_df, target_wb = load_excel_from_uploaded(target_file)
-            st.session_state['target_df'] = target_df
-            st.session_state['target_wb'] = target_wb
-            st.success(f"加载成功！共 {len(target_df.columns)} 列")
+            target_key = getattr(target_file, 'file_id', target_file.name)
+            if st.session_state.get('target_key') != target_key:
+                target_df, target_bytes, _ = load_excel_from_uploaded(target_file)
+                st.session_state['target_df'] = target_df
+                st.session_state['target_bytes'] = target_bytes
+                st.session_state['target_name'] = target_file.name
+                st.session_state['target_key'] = target_key
+            
+            st.success(f"加载成功！共 {len(st.session_state['target_df'].columns)} 列")
         except Exception as e:
             st.error(f"加载失败: {e}")
 
 if 'source_df' in st.session_state and 'target_df' in st.session_state:
     st.divider()
     
+    # 同一对文件只查找一次模板登记表，命中时跳过表头识别和列名模糊匹配
+    template_pair = (st.session_state.get('source_key'), st.session_state.get('target_key'))
+    if st.session_state.get('template_pair') != template_pair:
+        template_entry = find_template(
+            'backfill',
+            lambda entry: get_template_rows(
+                st.session_state['source_df'], st.session_state['target_df'],
+                entry['layout']['source_header_row'], entry['layout']['target_header_row']
+            )
+        )
+        if template_entry:
+            st.session_state['auto_header_row'] = template_entry['source_header_row']
+            st.session_state['auto_data_start'] = template_entry['source_data_start']
+            st.session_state['auto_target_header_row'] = template_entry['target_header_row']
+            st.session_state['auto_target_data_start'] = template_entry['target_data_start']
+        else:
+            auto_header = detect_header_row(st.session_state['source_df'])
+            st.session_state['auto_header_row'] = auto_header
+            st.session_state['auto_data_start'] = detect_data_start_row(st.session_state['source_df'], auto_header)
+            st.session_state['auto_target_header_row'] = 0
+            st.session_state['auto_target_data_start'] = 1
+        st.session_state['template_entry'] = template_entry
+        st.session_state['template_pair'] = template_pair
+    
+    template_entry = st.session_state.get('template_entry')
+    if template_entry:
+        st.success("已识别为登记过的模板组合，已套用上次确认的表头位置和列映射")
+    
     col1, col2 = st.columns(2)
     
     with col1:
@@ -230,12 +482,12 @@ if 'source_df' in st.session_state and 'target_df' in st.session_state:
         source_headers = source_df.iloc[header_row].tolist()
         st.markdown(f"**识别到的表头：** {source_headers}")
         
-        source_data = source_df.iloc[data_start_row:].copy()
-        source_data.columns = source_headers
-        source_data = source_data.reset_index(drop=True)
+        source_preview = source_df.iloc[data_start_row:data_start_row + 5].copy()
+        source_preview.columns = source_headers
+        source_preview = source_preview.reset_index(drop=True)
         
-        st.markdown(f"**数据预览（共{len(source_data)}行）：**")
-        st.dataframe(source_data.head(5), use_container_width=True)
+        st.markdown(f"**数据预览（共{max(0, st.session_state['source_rows'] - data_start_row)}行）：**")
+        st.dataframe(source_preview, use_container_width=True)
     
     with col2:
         st.subheader("目标模板配置")
@@ -246,7 +498,7 @@ if 'source_df' in st.session_state and 'target_df' in st.session_state:
             "目标表头行（从0开始）",
             min_value=0,
             max_value=max(1, len(target_df) - 1) if len(target_df) > 0 else 0,
-            value=0,
+            value=st.session_state.get('auto_target_header_row', 0),
             key="target_header_row"
         )
         
@@ -254,26 +506,54 @@ if 'source_df' in st.session_state and 'target_df' in st.session_state:
             "目标数据起始行（从0开始）",
             min_value=0,
             max_value=max(1, len(target_df) - 1) if len(target_df) > 0 else 1,
-            value=1,
+            value=st.session_state.get('auto_target_data_start', 1),
             key="target_data_start"
         )
         
         if len(target_df) > 0:
             target_headers = target_df.iloc[target_header_row].tolist()
         else:
-            target_wb = st.session_state['target_wb']
+            target_wb = load_workbook_from_bytes(st.session_state['target_bytes'], st.session_state['target_name'])
             ws = target_wb.active
-            target_headers = [cell.value for cell in ws[1]]
+            used_cols = used_range(ws)[1]
+            target_headers = list(next(ws.iter_rows(min_row=1, max_row=1, max_col=max(used_cols, 1),
+                                                    values_only=True), ()))
             target_data_start = 1
         
         st.markdown(f"**目标模板列：** {target_headers}")
     
+    extra_sources = st.session_state.get('extra_sources', [])
+    extra_layouts = []
+    if extra_sources:
+        with st.expander(f"其他源文件（{len(extra_sources)} 个，自动识别表头行，可手动调整）"):
+            for source in extra_sources:
+                auto_header = locate_header_row(source['df'], source_headers)
+                col1, col2, col3 = st.columns([2, 1, 1])
+                with col1:
+                    st.markdown(f"**{source['name']}**（{source['rows']} 行）")
+                with col2:
+                    extra_header = st.number_input(
+                        "表头行", min_value=0, max_value=max(0, len(source['df']) - 1),
+                        value=auto_header, key=f"extra_header_{source['key']}"
+                    )
+                with col3:
+                    extra_start = st.number_input(
+                        "数据起始行", min_value=0, max_value=max(0, len(source['df']) - 1),
+                        value=min(detect_data_start_row(source['df'], auto_header), max(0, len(source['df']) - 1)),
+                        key=f"extra_start_{source['key']}"
+                    )
+                extra_layouts.append((source, extra_header, extra_start))
+    
     st.divider()
     st.subheader("列映射配置")
     
     prefix = st.text_input("商品编码前缀（可选，将添加到商品编码前）", value="", key="code_prefix")
     
-    auto_mapping = auto_match_columns(source_headers, target_headers)
+    if (template_entry and header_row == template_entry['source_header_row']
+            and target_header_row == template_entry['target_header_row']):
+        auto_mapping = template_entry['mapping']
+    else:
+        auto_mapping = auto_match_columns(source_headers, target_headers)
     
     col1, col2, col3 = st.columns([2, 1, 2])
     
@@ -321,41 +601,79 @@ if 'source_df' in st.session_state and 'target_df' in st.session_state:
     
     st.divider()
     
+    stream_mode = st.checkbox(
+        "流式写入（大数据量导入）",
+        value=False,
+        key="stream_mode",
+        help="数据逐行写入，内存占用不随行数增长。保留模板表头、第一行数据的样式、列宽、冻结窗格、图片、数据验证、条件格式、打印设置和其他工作表；不保留模板中表头以下的原有内容、第一行以外的数据行样式和行高、图表工作表和数据透视表"
+    )
+    
     if st.button("执行数据导入", type="primary"):
         try:
-            target_wb = st.session_state['target_wb']
-            ws = target_wb.active
+            column_plan = []
+            for target_col_name, source_col_name in mapping_result.items():
+                for col_idx, col_name in enumerate(target_headers, 1):
+                    if str(col_name).strip() == target_col_name:
+                        column_plan.append((col_idx, target_col_name == "商品编码" and prefix, source_col_name.strip()))
+                        break
             
-            source_data_clean = source_data.copy()
+            # 映射按源列名解析为各源文件中的列位置，每个文件只读取映射到的列
+            layouts = [(st.session_state['source_name'], st.session_state['source_bytes'], header_row, data_start_row,
+                        source_headers)]
+            for source, extra_header, extra_start in extra_layouts:
+                layouts.append((source['name'], source['bytes'], extra_header, extra_start,
+                                source['df'].iloc[extra_header].tolist()))
+            jobs = []
+            for name, file_bytes, _, start_row, headers in layouts:
+                positions = header_positions(headers)
+                jobs.append((name, file_bytes, [positions.get(label) for _, _, label in column_plan], start_row))
             
-            for col in source_data_clean.columns:
-                source_data_clean[col] = source_data_clean[col].ffill()
+            # 多个源文件在多个进程中同时读取，各自向下填充后按列映射对齐、合并为一张表
+            outcomes = run_reads(read_source_columns, jobs)
+            for _, error in outcomes:
+                if error is not None:
+                    raise error
+            results = [result for result, _ in outcomes]
             
-            imported_count = 0
-            for idx, row in source_data_clean.iterrows():
-                target_row = target_data_start + idx + 1
-                
-                for target_col_name, source_col_name in mapping_result.items():
-                    target_col_idx = None
-                    for col_idx, col_name in enumerate(target_headers, 1):
-                        if str(col_name).strip() == target_col_name:
-                            target_col_idx = col_idx
-                            break
-                    
-                    if target_col_idx is None:
-                        continue
-                    
-                    source_value = row.get(source_col_name)
-                    
-                    if pd.notna(source_value):
-                        cell = ws.cell(row=target_row, column=target_col_idx)
-                        if target_col_name == "商品编码" and prefix:
-                            cell.value = prefix + str(source_value)
-                        else:
-                            cell.value = source_value
-                
-                imported_count += 1
+            frames = []
+            import_report = []
+            for (name, _, file_header, start_row, _), (_, _, positions, _), (df, elapsed) in zip(layouts, jobs, results):
+                frame = df.reindex(columns=positions)
+                frame.columns = range(len(positions))
+                frames.append(frame)
+                import_report.append({
+                    '文件': name,
+                    '表头行': file_header,
+                    '数据起始行': start_row,
+                    '行数': len(frame),
+                    '读取耗时(秒)': round(elapsed, 2),
+                    '未找到的源列': ', '.join(label for (_, _, label), pos in zip(column_plan, positions) if pos is None),
+                })
+            source_data = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            column_plan = [(col_idx, add_prefix, i) for i, (col_idx, add_prefix, _) in enumerate(column_plan)]
+            
+            target_wb = load_workbook_from_bytes(st.session_state['target_bytes'], st.session_state['target_name'])
+            ws = target_wb.active
+            
+            def iter_data_rows():
+                for values in source_data.itertuples(index=False, name=None):
+                    row = {}
+                    for col_idx, add_prefix, source_pos in column_plan:
+                        source_value = values[source_pos]
+                        if pd.notna(source_value):
+                            row[col_idx] = prefix + str(source_value) if add_prefix else source_value
+                    yield row
             
+            if stream_mode:
+                target_wb, imported_count = fill_template_streaming(ws, target_data_start, iter_data_rows())
+            else:
+                imported_count = 0
+                for idx, row in enumerate(iter_data_rows()):
+                    target_row = target_data_start + idx + 1
+                    for col_idx, value in row.items():
+                        ws.cell(row=target_row, column=col_idx).value = value
+                    imported_count += 1
+                
             output_buffer = BytesIO()
             target_wb.save(output_buffer)
             output_buffer.seek(0)
@@ -363,7 +681,26 @@ if 'source_df' in st.session_state and 'target_df' in st.session_state:
             st.session_state['output_buffer'] = output_buffer
             st.session_state['imported_count'] = imported_count
             
-            st.success(f"成功导入 {imported_count} 行数据！")
+            st.success(f"成功导入 {imported_count} 行数据（来自 {len(import_report)} 个源文件）！")
+            if len(import_report) > 1:
+                st.dataframe(pd.DataFrame(import_report), use_container_width=True, hide_index=True)
+            
+            # 登记本次确认的表头位置和列映射，下次上传同一组模板时直接套用
+            try:
+                remember_template(
+                    'backfill',
+                    get_template_rows(source_df, target_df, header_row, target_header_row),
+                    {
+                        'layout': {'source_header_row': header_row, 'target_header_row': target_header_row},
+                        'source_header_row': header_row,
+                        'source_data_start': data_start_row,
+                        'target_header_row': target_header_row,
+                        'target_data_start': target_data_start,
+                        'mapping': mapping_result,
+                    }
+                )
+            except OSError as e:
+                st.warning(f"模板配置登记失败: {e}")
             
         except Exception as e:
             st.error(f"导入失败: {e}")
@@ -391,7 +728,7 @@ if 'source_df' in st.session_state and 'target_df' in st.session_state:
 
 st.sidebar.markdown("### 使用说明")
 st.sidebar.markdown("""
-1. **上传文件**：上传源文件和目标模板
+1. **上传文件**：上传源文件（可多选）和目标模板
 2. **配置源文件**：
    - 确认表头行位置
    - 确认数据起始行位置
@@ -414,6 +751,8 @@ st.sidebar.markdown("""
 st.sidebar.markdown("### 功能说明")
 st.sidebar.markdown("""
 - 自动向下填充源文件中的空值（如店铺名称）
+- 多个源文件按列名对齐后合并导入，各文件可单独设置表头行
 - 保留目标模板的格式和样式
 - 支持 .xls 和 .xlsx 格式
+- 大数据量可勾选流式写入，内存占用不随行数增长
 """)
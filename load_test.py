@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import math
+import time
+import pickle
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+STEPS = ('open', 'upload', 'configure', 'process', 'download')
+APPS = ('streamlit', 'backfill')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='用 AppTest 模拟多个并发会话，测量两个 Streamlit 应用各步骤的延迟、峰值内存和会话状态大小'
+    )
+    parser.add_argument('--apps', nargs='+', choices=APPS, default=list(APPS), help='要测试的应用')
+    parser.add_argument('--sessions', type=int, default=4, help='同时进行的会话数')
+    parser.add_argument('--rounds', type=int, default=1, help='每个并发会话重复的轮数')
+    parser.add_argument('--rows', type=int, default=2000, help='生成测试文件的行数')
+    parser.add_argument('--timeout', type=float, default=300, help='单次脚本运行的超时时间（秒）')
+    parser.add_argument('--max-p95', type=float, help='任一步骤的 p95 延迟超过该值（秒）时以非零状态退出')
+    parser.add_argument('--output', help='把测量结果以JSON格式写入该文件')
+    return parser.parse_args()
+
+
+def make_backfill_files(directory, rows):
+    """生成回填用的源文件（店铺名称只在每组第一行出现）和目标模板"""
+    from openpyxl import Workbook
+
+    source = os.path.join(directory, 'purchase.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['采购明细导出'])
+    ws.append(['店铺名称', '型号', '数量', '单价', '总价'])
+    for i in range(rows):
+        ws.append([f'店铺{i // 20}' if i % 20 == 0 else None, f'M{i:05d}', i % 50 + 1, 9.5, (i % 50 + 1) * 9.5])
+    wb.save(source)
+
+    template = os.path.join(directory, 'template.xlsx')
+    wb = Workbook()
+    wb.active.append(['商品编码', '采购数量', '单价', '采购金额', '供应商'])
+    wb.save(template)
+    return source, template
+
+
+def upload_value(path):
+    with open(path, 'rb') as f:
+        return os.path.basename(path), f.read(), XLSX_MIME if path.endswith('.xlsx') else 'text/csv'
+
+
+@contextmanager
+def timed(timings, step):
+    start = time.perf_counter()
+    yield
+    timings[step] = time.perf_counter() - start
+
+
+def widget(elements, label):
+    """按标签取控件，避免依赖控件在页面上的顺序"""
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f'页面上没有控件: {label}')
+
+
+def check_run(at, step):
+    if at.exception:
+        raise RuntimeError(f'{step}: {at.exception[0].value}')
+    if at.error:
+        raise RuntimeError(f'{step}: {at.error[0].value}')
+
+
+def session_state_size(at):
+    """会话状态中各值 pickle 后的总字节数，以及无法序列化的键"""
+    state = at._session_state.filtered_state
+    size, unpicklable = 0, []
+    for key, value in state.items():
+        try:
+            size += len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            unpicklable.append(key)
+    return size, unpicklable
+
+
+def run_order_session(files, timeout):
+    """订单表更新：上传ERP库存表和订单表 -> 确认目标列 -> 开始处理 -> 下载"""
+    from streamlit.testing.v1 import AppTest
+
+    timings = {}
+    at = AppTest.from_file(os.path.join(HERE, 'streamlit_app.py'), default_timeout=timeout)
+    with timed(timings, 'open'):
+        at.run()
+    check_run(at, 'open')
+    with timed(timings, 'upload'):
+        at.file_uploader(key='from_file').set_value(files['erp'])
+        at.file_uploader(key='dist_file').set_value(files['order'])
+        at.run()
+    check_run(at, 'upload')
+    with timed(timings, 'configure'):
+        target = widget(at.selectbox, '目标列（要填入数据的列）')
+        target.set_value(target.value).run()
+    check_run(at, 'configure')
+    with timed(timings, 'process'):
+        widget(at.button, '开始处理').click().run()
+    check_run(at, 'process')
+    with timed(timings, 'download'):
+        widget(at.download_button, '📥 下载处理后的Excel文件').click().run()
+    check_run(at, 'download')
+    return timings, at, len(at.session_state['output_file'])
+
+
+def run_backfill_session(files, timeout):
+    """数据回填：上传源文件和模板 -> 调整列映射 -> 执行导入 -> 下载"""
+    from streamlit.testing.v1 import AppTest
+
+    timings = {}
+    at = AppTest.from_file(os.path.join(HERE, 'excel_backfill_app.py'), default_timeout=timeout)
+    with timed(timings, 'open'):
+        at.run()
+    check_run(at, 'open')
+    with timed(timings, 'upload'):
+        at.file_uploader(key='source_uploader').set_value([files['source']])
+        at.file_uploader(key='target_uploader').set_value(files['template'])
+        at.run()
+    check_run(at, 'upload')
+    with timed(timings, 'configure'):
+        at.selectbox(key='map_供应商').set_value('店铺名称').run()
+    check_run(at, 'configure')
+    with timed(timings, 'process'):
+        widget(at.button, '执行数据导入').click().run()
+    check_run(at, 'process')
+    with timed(timings, 'download'):
+        widget(at.download_button, '下载填充后的Excel文件').click().run()
+    check_run(at, 'download')
+    return timings, at, len(at.session_state['output_buffer'].getvalue())
+
+
+SESSIONS = {'streamlit': run_order_session, 'backfill': run_backfill_session}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(values, pct):
+    """最近秩百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+# AppTest 每次运行都会替换进程级的 Runtime 实例，同一进程内的多个会话不能并发运行，
+# 因此每个并发会话在单独的工作进程中执行；内存按各进程的增量估算同一服务进程承载 N 个会话的占用
+_worker = {}
+
+
+def init_worker(app, files, timeout):
+    """工作进程初始化：先跑一个会话预热（导入模块、首次编译脚本），记录基线内存"""
+    # 应用页面上的弃用提示和表格类型转换警告会刷屏，只输出错误日志
+    logging.disable(logging.WARNING)
+    _worker.update(app=app, files=files, timeout=timeout)
+    SESSIONS[app](files, timeout)
+    _worker['rss_before'] = peak_rss_mb()
+
+
+def run_worker_session(_):
+    start = time.time()
+    try:
+        timings, at, output_size = SESSIONS[_worker['app']](_worker['files'], _worker['timeout'])
+    except Exception as e:
+        return {'error': str(e)}
+    state_size, unpicklable = session_state_size(at)
+    return {'timings': timings, 'state_size': state_size, 'unpicklable': unpicklable, 'output_size': output_size,
+            'start': start, 'end': time.time(), 'pid': os.getpid(),
+            'rss_before': _worker['rss_before'], 'rss_peak': peak_rss_mb()}
+
+
+def load_test(app, files, sessions, rounds, timeout):
+    """用 sessions 个工作进程同时运行会话，共 sessions * rounds 个"""
+    # AppTest 运行时会把 __main__ 换成应用脚本，工作进程中的函数须按模块名引用才能反序列化
+    import load_test as module
+
+    with multiprocessing.Pool(sessions, initializer=module.init_worker, initargs=(app, files, timeout)) as pool:
+        outcomes = pool.map(module.run_worker_session, range(sessions * rounds), chunksize=1)
+    results = [r for r in outcomes if 'error' not in r]
+    errors = [r['error'] for r in outcomes if 'error' in r]
+
+    summary = {'sessions': sessions, 'rounds': rounds, 'completed': len(results), 'errors': errors, 'steps': {}}
+    if not results:
+        return summary
+    summary['wall_s'] = round(max(r['end'] for r in results) - min(r['start'] for r in results), 2)
+    for step in STEPS:
+        values = [r['timings'][step] for r in results]
+        summary['steps'][step] = {'p50_s': round(percentile(values, 50), 3),
+                                  'p95_s': round(percentile(values, 95), 3),
+                                  'max_s': round(max(values), 3)}
+    state_sizes = [r['state_size'] for r in results]
+    summary['state_kb'] = {'p50': round(percentile(state_sizes, 50) / 1024, 1),
+                           'max': round(max(state_sizes) / 1024, 1)}
+    summary['unpicklable_keys'] = sorted({key for r in results for key in r['unpicklable']})
+    summary['output_kb'] = round(results[0]['output_size'] / 1024, 1)
+
+    # 每个进程的最终峰值减去预热后的基线，即该进程内会话带来的内存增量
+    workers = {}
+    for r in results:
+        if r['rss_peak'] is not None:
+            before, peak = workers.get(r['pid'], (r['rss_before'], r['rss_peak']))
+            workers[r['pid']] = (before, max(peak, r['rss_peak']))
+    if workers:
+        baseline = min(before for before, _ in workers.values())
+        growth = [peak - before for before, peak in workers.values()]
+        summary['rss_mb'] = {'baseline': baseline,
+                             'session_peak': round(max(growth), 1),
+                             'estimated_total': round(baseline + sum(growth), 1)}
+    return summary
+
+
+def print_summary(app, summary):
+    print(f"\n== {app}: {summary['sessions']} 个并发会话 × {summary['rounds']} 轮，"
+          f"完成 {summary['completed']}，失败 {len(summary['errors'])}，总耗时 {summary.get('wall_s', '-')}s")
+    print(f"{'步骤':<10}{'p50(s)':>10}{'p95(s)':>10}{'最长(s)':>10}")
+    for step, item in summary['steps'].items():
+        print(f"{step:<12}{item['p50_s']:>10}{item['p95_s']:>10}{item['max_s']:>10}")
+    if 'rss_mb' in summary:
+        print(f"内存: 预热后基线 {summary['rss_mb']['baseline']} MB，单进程会话增量最大 "
+              f"{summary['rss_mb']['session_peak']} MB，估算同一进程承载全部并发会话的峰值 "
+              f"{summary['rss_mb']['estimated_total']} MB")
+    if 'state_kb' in summary:
+        print(f"会话状态大小: 中位数 {summary['state_kb']['p50']} KB，最大 {summary['state_kb']['max']} KB")
+        if summary['unpicklable_keys']:
+            print(f"无法序列化的会话状态: {', '.join(summary['unpicklable_keys'])}")
+    for error in summary['errors'][:5]:
+        print(f"失败: {error}")
+
+
+def main():
+    args = parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # 模板登记表和型号别名表写到临时目录，不影响正式数据
+        os.environ['TEMPLATE_REGISTRY_PATH'] = os.path.join(directory, 'template_registry.json')
+        os.environ['MODEL_ALIAS_PATH'] = os.path.join(directory, 'model_aliases.json')
+        for name in ('ERP_INDEX_PATH', 'ERP_SQLITE_PATH'):
+            os.environ.pop(name, None)
+
+        from bench_startup import make_sample_files
+
+        files = {}
+        erp, order = make_sample_files(directory, args.rows)
+        files['streamlit'] = {'erp': upload_value(erp), 'order': upload_value(order)}
+        source, template = make_backfill_files(directory, args.rows)
+        files['backfill'] = {'source': upload_value(source), 'template': upload_value(template)}
+
+        for app in args.apps:
+            results[app] = load_test(app, files[app], args.sessions, args.rounds, args.timeout)
+            print_summary(app, results[app])
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n测量结果已写入: {args.output}")
+
+    failed = any(summary['errors'] for summary in results.values())
+    if args.max_p95 is not None:
+        for app, summary in results.items():
+            for step, item in summary['steps'].items():
+                if item['p95_s'] > args.max_p95:
+                    print(f"{app} 的 {step} 步骤 p95 {item['p95_s']}s 超过 {args.max_p95}s")
+                    failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
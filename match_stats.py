@@ -0,0 +1,44 @@
+def collect_match_stats(models, model_map, multi_column=False, skip_negative=False, target_cols=None):
+    """统计订单表型号与ERP索引的匹配情况，规则与实际写入时一致，不读写任何文件
+
+    models 为订单表型号列逐行的值，空值和非文本会被忽略；别名需事先加入 model_map。
+    单列差值时匹配到的非空值都写入，skip_negative 为 True 时只写入非负数（两个应用写入默认差值时的做法）；多列时值全为空的行不写入。
+    target_cols 为多列时各值在订单表中的列号，订单表中没有对应列（列号为空）的值不会写入，也不计入。
+    返回字典：rows 有型号的行数，models 不同型号数，matched 匹配到的行数，written 将写入的行数，
+    negative 差值为负的行数，empty 计算结果为空的行数，missing 未匹配的行数，missing_models 未匹配的型号。
+    """
+    stats = {'rows': 0, 'models': 0, 'matched': 0, 'written': 0, 'negative': 0, 'empty': 0, 'missing': 0}
+    seen = set()
+    missing_models = set()
+    for model in models:
+        if not isinstance(model, str) or not model:
+            continue
+        stats['rows'] += 1
+        seen.add(model)
+        if model not in model_map:
+            stats['missing'] += 1
+            missing_models.add(model)
+            continue
+        stats['matched'] += 1
+        if multi_column:
+            values = model_map.row(model)
+            if target_cols is not None:
+                values = [value for value, col_idx in zip(values, target_cols) if col_idx]
+            if any(value == value for value in values):
+                stats['written'] += 1
+            else:
+                stats['empty'] += 1
+            continue
+        value = model_map[model]
+        if value != value:
+            # 空值不写入，单元格保持原样
+            stats['empty'] += 1
+        elif value < 0:
+            stats['negative'] += 1
+            if not skip_negative:
+                stats['written'] += 1
+        else:
+            stats['written'] += 1
+    stats['models'] = len(seen)
+    stats['missing_models'] = sorted(missing_models)
+    return stats
@@ -0,0 +1,60 @@
+import json
+import os
+
+from json_store import locked, write_json_atomic
+
+# 型号别名表默认保存在项目目录下，可通过环境变量修改
+DEFAULT_ALIAS_PATH = os.environ.get(
+    'MODEL_ALIAS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.model_aliases.json')
+)
+
+
+def load_aliases(path=None):
+    """读取型号别名表：ERP产品型号 -> 订单表产品型号"""
+    path = path or DEFAULT_ALIAS_PATH
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            aliases = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return aliases if isinstance(aliases, dict) else {}
+
+
+def save_aliases(aliases, path=None):
+    """原子写入型号别名表"""
+    write_json_atomic(path or DEFAULT_ALIAS_PATH, aliases, sort_keys=True)
+
+
+def add_aliases(pairs, path=None):
+    """把用户确认的 (ERP型号, 订单表型号) 写入别名表，返回更新后的别名表"""
+    path = path or DEFAULT_ALIAS_PATH
+    # 加锁后重新读取，多个会话同时保存别名时不会互相覆盖
+    with locked(path):
+        aliases = load_aliases(path)
+        for erp_model, order_model in pairs:
+            aliases[str(erp_model).strip()] = str(order_model).strip()
+        save_aliases(aliases, path)
+    return aliases
+
+
+def expand_order_models(order_models, aliases):
+    """订单表型号加上以别名方式对应的ERP型号，用于只按订单表型号查询ERP数据"""
+    order_models = set(order_models)
+    return order_models | {erp_model for erp_model, order_model in aliases.items() if order_model in order_models}
+
+
+def apply_aliases(model_diff_map, aliases):
+    """把别名加入精确匹配索引，使订单表中的别名型号也能取到ERP数据
+
+    订单表型号本身已在ERP中存在时不覆盖。返回加入索引的别名数量。
+    """
+    added = 0
+    for erp_model, order_model in aliases.items():
+        if erp_model in model_diff_map and order_model not in model_diff_map:
+            if hasattr(model_diff_map, 'alias'):
+                model_diff_map.alias(order_model, erp_model)
+            else:
+                model_diff_map[order_model] = model_diff_map[erp_model]
+            added += 1
+    return added
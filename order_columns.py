@@ -0,0 +1,65 @@
+from sheet_range import used_range
+
+# 关键词按优先级排列：同一表头行中有多列命中时取优先级最高的关键词所在列，而不是最左边的列，
+# 例如“库存数量”在“所需数量”左边时仍取“所需数量”
+PRODUCT_MODEL_KEYWORDS = ['产品型号', '商品货号', '货号', '型号', 'model', 'code']
+TARGET_COLUMN_KEYWORDS = ['所需数量', '订货数量', '进货数量', '数量/个', '数量', 'quantity', 'qty']
+
+# 列标题在前 10 行内查找，数据起始行在标题行之后 4 行内查找
+HEADER_SCAN_ROWS = 10
+DATA_SCAN_ROWS = 4
+
+
+def _find_keyword_column(row, keywords):
+    """按关键词优先级在一行表头中查找列，返回列号（从1开始），没有命中时返回 None"""
+    for keyword in keywords:
+        for col_idx, cell_value in enumerate(row, 1):
+            if isinstance(cell_value, str) and keyword in cell_value:
+                return col_idx
+    return None
+
+
+def detect_column_info(ws, max_row=None, max_col=None):
+    """智能识别订单表的列信息和数据起始行
+
+    只逐行读取表头附近的单元格值，普通工作表和只读工作表都适用。
+    max_row / max_col 默认取实际有数据的区域；只读工作表算该区域要扫描全表，可传入已知的边界。
+    """
+    if max_row is None or max_col is None:
+        # 以实际有数据的区域为界，整列设置过格式的表格不会扫描到上万列
+        max_row, max_col = used_range(ws)
+
+    product_model_col_idx = None
+    target_col_idx = None
+    header_row_idx = None
+    data_start_row = None
+
+    head = []
+    if max_row and max_col:
+        head = list(ws.iter_rows(min_row=1, max_row=min(HEADER_SCAN_ROWS + DATA_SCAN_ROWS, max_row),
+                                 max_col=max_col, values_only=True))
+
+    for row_idx, row in enumerate(head[:HEADER_SCAN_ROWS], 1):
+        if not product_model_col_idx:
+            product_model_col_idx = _find_keyword_column(row, PRODUCT_MODEL_KEYWORDS)
+            if product_model_col_idx:
+                header_row_idx = row_idx
+
+        if not target_col_idx:
+            target_col_idx = _find_keyword_column(row, TARGET_COLUMN_KEYWORDS)
+            if target_col_idx and not header_row_idx:
+                header_row_idx = row_idx
+
+    if header_row_idx:
+        data_start_row = header_row_idx + 1
+        for row_idx, row in enumerate(head[header_row_idx:header_row_idx + DATA_SCAN_ROWS], header_row_idx + 1):
+            if any(cell_value is not None and cell_value != '' for cell_value in row):
+                data_start_row = row_idx
+                break
+
+    return {
+        'product_model_col_idx': product_model_col_idx,
+        'target_col_idx': target_col_idx,
+        'header_row_idx': header_row_idx,
+        'data_start_row': data_start_row
+    }
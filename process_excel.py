@@ -1,15 +1,59 @@
-import pandas as pd
 import os
+import json
+import time
 import shutil
+import fnmatch
 import argparse
+import contextlib
 from datetime import datetime
+from erp_reader import read_erp_table, iter_erp_chunks, iter_erp_records, describe_source
+from erp_index import (ModelIndex, build_model_index, build_model_index_from_records,
+                       is_index_file, attach_index, publish_index)
+from erp_sqlite import is_erp_snapshot, load_snapshot_index
+from model_aliases import load_aliases, apply_aliases, expand_order_models
+from sheet_range import used_range
+from order_columns import detect_column_info
+from match_stats import collect_match_stats
+from value_exprs import (LEGACY_VALUE_COLUMN, parse_value_exprs, compute_diff, value_calculator,
+                         uses_value_exprs, target_headers, find_header_columns)
+
+# 不超过该大小的ERP导出走不依赖 pandas 的快速路径，省去导入 pandas 的时间
+LEAN_SOURCE_MAX_BYTES = 2 * 1024 * 1024
 
 # 命令行参数解析
 def parse_args():
     parser = argparse.ArgumentParser(description='处理Excel文件并计算更新数据')
-    parser.add_argument('source_file', help='源文件路径')
-    parser.add_argument('target_file', help='目标文件路径')
-    return parser.parse_args()
+    parser.add_argument('source_file', nargs='?', help='源文件路径')
+    parser.add_argument('target_file', nargs='?', help='目标文件路径')
+    parser.add_argument('--chunksize', type=int, default=0,
+                        help='分块读取源文件的每块行数，适合超大ERP导出；默认整表读取')
+    parser.add_argument('--lean-max-bytes', type=int, default=LEAN_SOURCE_MAX_BYTES,
+                        help='源文件不超过该字节数时不使用 pandas 直接逐行处理，设为 0 关闭')
+    parser.add_argument('--expr', metavar='JSON',
+                        help='目标值表达式（JSON 文本或文件路径），可按箱规倍数取整并写入多个目标列')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只统计匹配情况（匹配、负数、缺失的型号数量），不生成输出文件')
+    parser.add_argument('--publish-index', metavar='PATH',
+                        help='把ERP产品型号索引发布为共享索引文件（如 /dev/shm/erp.idx），供其他进程直接映射使用')
+    parser.add_argument('--watch', action='store_true',
+                        help='监视模式：持续监视ERP目录和订单表目录，有新文件时自动处理')
+    parser.add_argument('--from-dir', default=os.path.join('excels', 'from'), help='监视模式下的ERP库存表目录')
+    parser.add_argument('--dist-dir', default=os.path.join('excels', 'dist'), help='监视模式下的订单表目录')
+    parser.add_argument('--output-dir', default=os.path.join('excels', 'output'), help='监视模式下的输出目录')
+    parser.add_argument('--workers', type=int, default=None, help='监视模式下并行处理订单表的进程数')
+    parser.add_argument('--interval', type=float, default=2.0, help='监视模式下的轮询间隔（秒）')
+    parser.add_argument('--settle', type=float, default=3.0,
+                        help='文件大小和修改时间保持不变多少秒后才视为写入完成')
+    args = parser.parse_args()
+    if not args.watch and not (args.source_file and args.target_file):
+        parser.error('需要指定源文件和目标文件，或使用 --watch 监视模式')
+    if args.watch and args.dry_run:
+        parser.error('--dry-run 不能与 --watch 同时使用')
+    try:
+        args.value_specs = parse_value_exprs(args.expr or '')
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 # 获取带时间戳的文件名
 def get_timestamped_filename(file_path):
@@ -20,17 +64,14 @@ def get_timestamped_filename(file_path):
     return os.path.join(directory, f'{name}_{timestamp}{ext}')
 
 # 主函数
-def extract_model(code):
-    """从编码中提取产品型号"""
-    if isinstance(code, str) and '-' in code:
-        parts = code.split('-')
-        if len(parts) >= 2:
-            return '-'.join(parts[1:])
-    return None
-
 def main():
     # 解析命令行参数
     args = parse_args()
+    if args.watch:
+        watch_folders(args.from_dir, args.dist_dir, args.output_dir, interval=args.interval,
+                      settle=args.settle, workers=args.workers, chunksize=args.chunksize,
+                      lean_max_bytes=args.lean_max_bytes, value_specs=args.value_specs)
+        return
     source_file = args.source_file
     target_file = args.target_file
     
@@ -45,57 +86,174 @@ def main():
         print(f"错误：目标文件不存在: {target_file}")
         return
     
-    # 读取源文件
-    print(f"读取源文件: {source_file}")
-    try:
-        # 注意：虽然文件扩展名是.csv，但实际是Excel格式
-        # 使用第二行作为列名（索引为1）
-        df_source = pd.read_excel(source_file, header=1)
-        print(f"成功读取源文件，共 {len(df_source)} 行数据")
-        print("源文件列名:")
-        for i, col in enumerate(df_source.columns):
-            print(f"{i}: {col}")
-            # 打印每列的前几个值
-            print(f"  前5个值: {df_source[col].head().tolist()}")
-    except Exception as e:
-        print(f"读取源文件失败: {e}")
+    # ERP快照只查询订单表中出现的型号，先读取订单表的型号列；试运行也只需要型号列
+    start = time.perf_counter()
+    order_models = None
+    if args.dry_run or is_erp_snapshot(source_file):
+        try:
+            order_models = read_order_models(target_file)
+        except ValueError as e:
+            print(f"错误：{e}")
+            return
+        except Exception as e:
+            print(f"读取订单表失败: {e}")
+            return
+    model_diff_map = load_model_map(source_file, args.chunksize, args.lean_max_bytes, args.value_specs, order_models)
+    if model_diff_map is None:
         return
     
-    # 提取产品型号
-    print("提取产品型号...")
-    # 尝试常见的列名
-    merchant_code_cols = [col for col in df_source.columns if '商家' in col and '编码' in col]
-    print(f"找到的商家编码列: {merchant_code_cols}")
-    
-    for col in merchant_code_cols:
-        df_source[f'产品型号_{col}'] = df_source[col].apply(extract_model)
-    
-    # 确定最终产品型号
-    model_cols = [col for col in df_source.columns if '产品型号_' in col]
-    print(f"找到的产品型号列: {model_cols}")
-    
-    if model_cols:
-        # 使用第一个找到的产品型号列
-        df_source['产品型号'] = df_source[model_cols[0]]
-        # 如果有多个型号列，使用fillna合并
-        for col in model_cols[1:]:
-            df_source['产品型号'] = df_source['产品型号'].fillna(df_source[col])
-    else:
-        print("警告：未能提取任何产品型号")
+    if args.dry_run:
+        print_dry_run(model_diff_map, order_models, time.perf_counter() - start, target_file)
         return
     
-
+    if args.publish_index:
+        if not isinstance(model_diff_map, ModelIndex):
+            model_diff_map = ModelIndex.from_mapping(model_diff_map)
+        version = publish_index(model_diff_map, args.publish_index)
+        print(f"已发布共享索引: {args.publish_index}（版本 {version}）")
     
-    # 计算差值
-    print("计算差值...")
-    if '实际可用数' in df_source.columns and '30天销量' in df_source.columns:
-        df_source['差值'] = df_source['实际可用数'] - df_source['30天销量']
-    else:
-        print("警告：未找到'实际可用数'或'30天销量'列")
+    update_order_sheet(model_diff_map, target_file)
+
+def print_dry_run(model_diff_map, order_models, elapsed, target_file):
+    """试运行：按实际写入的规则统计订单表型号的匹配情况，不打开订单表写入"""
+    if not order_models:
+        print("错误：订单表的产品型号列中没有读取到产品型号")
         return
+    alias_count = apply_aliases(model_diff_map, load_aliases())
+    if alias_count:
+        print(f"应用型号别名 {alias_count} 个")
+    headers = target_headers(getattr(model_diff_map, 'columns', (LEGACY_VALUE_COLUMN,)))
+    multi_column = uses_value_exprs(model_diff_map)
+    target_cols = None
+    if multi_column:
+        # 与写入时一样，只统计订单表中有对应列的目标值
+        found = read_target_columns(target_file, headers)
+        target_cols = [found.get(header) for header in headers]
+        missing_headers = [header for header in headers if header not in found]
+        if missing_headers:
+            print(f"警告：订单表中未找到目标列 {', '.join(missing_headers)}，该列不写入")
+        headers = [header for header in headers if header in found]
+    stats = collect_match_stats(order_models, model_diff_map, multi_column=multi_column, skip_negative=True,
+                                target_cols=target_cols)
+    print(f"试运行结果（未生成输出文件，耗时 {elapsed:.2f} 秒）:")
+    print(f"  订单表: {stats['rows']} 行，{stats['models']} 个产品型号")
+    print(f"  匹配到: {stats['matched']} 行，将写入 {stats['written']} 行（目标列: {', '.join(headers) or '无'}）")
+    print(f"  其中差值为负: {stats['negative']} 行，计算结果为空: {stats['empty']} 行")
+    print(f"  ERP中没有的型号: {stats['missing']} 行，{len(stats['missing_models'])} 个")
+    for model in stats['missing_models'][:20]:
+        print(f"    {model}")
+    if len(stats['missing_models']) > 20:
+        print(f"    ……另有 {len(stats['missing_models']) - 20} 个")
+
+def read_order_models(target_file):
+    """以只读方式读取订单表的产品型号，列和数据起始行按与 Web 界面相同的规则识别
+
+    找不到产品型号列时抛出 ValueError。
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(target_file, read_only=True)
+    try:
+        ws = wb.active
+        # 只读工作表用文件记录的尺寸作为边界，避免为找表头先扫描全表
+        col_info = detect_column_info(ws, ws.max_row, ws.max_column)
+        model_col = col_info['product_model_col_idx']
+        if not model_col:
+            raise ValueError('未在订单表前10行找到产品型号列')
+        values = ws.iter_rows(min_row=col_info['data_start_row'], min_col=model_col, max_col=model_col,
+                              values_only=True)
+        return [value for (value,) in values if isinstance(value, str)]
+    finally:
+        wb.close()
+
+def read_target_columns(target_file, headers):
+    """以只读方式在订单表表头中查找各目标列，返回 {列名: 列号}，查找范围与写入时相同"""
+    from openpyxl import load_workbook
+    wb = load_workbook(target_file, read_only=True)
+    try:
+        ws = wb.active
+        col_info = detect_column_info(ws, ws.max_row, ws.max_column)
+        return find_header_columns(ws, headers, max(1, (col_info['data_start_row'] or 1) - 1), ws.max_column)
+    finally:
+        wb.close()
+
+def load_model_map(source_file, chunksize=0, lean_max_bytes=LEAN_SOURCE_MAX_BYTES, value_specs=None,
+                   order_models=None):
+    """读取ERP库存表（或已发布的共享索引、ERP快照），返回产品型号到差值的映射，失败时返回 None
+
+    指定 value_specs 时按目标值表达式计算，返回以各目标列为列的 ModelIndex。
+    源文件为 SQLite 格式的ERP快照时只查询 order_models 中的型号。
+    """
+    if is_index_file(source_file):
+        # 源文件是已发布的共享索引，直接只读映射，无需解析ERP导出
+        try:
+            model_diff_map = attach_index(source_file)
+        except (OSError, ValueError) as e:
+            print(f"读取共享索引失败: {e}")
+            return
+        print(f"映射共享索引: {source_file}（版本 {model_diff_map.version}，共 {len(model_diff_map)} 个产品型号）")
+        if value_specs:
+            print(f"注意：共享索引已按发布时的设置计算，忽略 --expr，目标列: {', '.join(model_diff_map.columns)}")
+    elif is_erp_snapshot(source_file):
+        # 按订单表中的型号走主键查询，耗时与订单表大小成正比
+        if order_models is None:
+            print("错误：使用ERP快照时需要先读取订单表的产品型号")
+            return
+        models = expand_order_models(order_models, load_aliases())
+        print(f"查询ERP快照: {source_file}（订单表 {len(models)} 个产品型号）")
+        try:
+            model_diff_map = load_snapshot_index(source_file, models, *value_calculator(value_specs))
+        except KeyError:
+            print("警告：未找到'实际可用数'或'30天销量'列")
+            return
+        except Exception as e:
+            print(f"查询ERP快照失败: {e}")
+            return
+        print(f"在ERP快照中找到 {len(model_diff_map)} 个产品型号")
+    elif not value_specs and not chunksize and os.path.getsize(source_file) <= lean_max_bytes:
+        # 小文件逐行读取并直接建索引，不导入 pandas
+        print(f"读取源文件: {source_file}（{describe_source(source_file)}，快速模式）")
+        try:
+            model_diff_map = build_model_index_from_records(iter_erp_records(source_file, header=1), compute_diff)
+        except KeyError:
+            print("警告：未找到'实际可用数'或'30天销量'列")
+            return
+        except Exception as e:
+            print(f"读取源文件失败: {e}")
+            return
+        print(f"成功提取产品型号并计算差值，共 {len(model_diff_map)} 个")
+    else:
+        # 整表读取与分块读取都经由同一个计算函数建成紧凑的型号索引，与 Web 界面一致
+        compute_values, columns, usecols = value_calculator(value_specs)
+        if value_specs:
+            print(f"按目标值表达式计算: {', '.join(columns)}")
+        try:
+            if chunksize:
+                print(f"分块读取源文件: {source_file}（每块 {chunksize} 行）")
+                chunks = iter_erp_chunks(source_file, header=1, usecols=usecols, chunksize=chunksize)
+            else:
+                # 按文件内容识别格式：扩展名为.csv的导出可能实际是Excel格式
+                print(f"读取源文件: {source_file}（{describe_source(source_file)}）")
+                df_source = read_erp_table(source_file, header=1, usecols=usecols)
+                print(f"成功读取源文件，共 {len(df_source)} 行数据，列名: {', '.join(map(str, df_source.columns))}")
+                chunks = [df_source]
+            model_diff_map = build_model_index(chunks, compute_values, columns)
+        except KeyError:
+            print("警告：未找到'实际可用数'或'30天销量'列")
+            return
+        except ValueError as e:
+            print(f"错误：{e}")
+            return
+        except Exception as e:
+            print(f"读取源文件失败: {e}")
+            return
+        print(f"成功提取产品型号并计算{'目标值' if value_specs else '差值'}，共 {len(model_diff_map)} 个")
     
+    return model_diff_map
+
+def update_order_sheet(model_diff_map, target_file, output_file=None):
+    """复制订单表并按产品型号填入差值，返回更新的单元格数量，失败时返回 None"""
     # 生成带时间戳的输出文件名
-    output_file = get_timestamped_filename(target_file)
+    output_file = output_file or get_timestamped_filename(target_file)
     print(f"复制原始文件到: {output_file}")
     try:
         shutil.copy2(target_file, output_file)
@@ -112,7 +270,9 @@ def main():
         wb = load_workbook(output_file, data_only=False, keep_links=True)
         ws = wb.active
         print(f"成功打开文件，工作表名称: {ws.title}")
-        print(f"文件包含 {ws.max_row} 行, {ws.max_column} 列")
+        # 以实际有数据的区域为界，整行整列设置过格式的表格不会扫描大量空单元格
+        max_row, max_col = used_range(ws)
+        print(f"文件包含 {max_row} 行, {max_col} 列（格式区域 {ws.max_row} 行, {ws.max_column} 列）")
         print(f"文件包含 {len(ws._images)} 个图片")
     except Exception as e:
         print(f"打开文件失败: {e}")
@@ -121,55 +281,81 @@ def main():
     # 智能识别产品型号列和所需数量列
     print("智能识别列...")
     
-    # 查找产品型号列（包含'产品型号'值的列）
-    product_model_col_idx = None
-    required_qty_col_idx = None
-    
-    # 遍历前5行查找列标题
-    for row_idx in range(1, 6):  # 遍历前5行
-        for col_idx in range(1, ws.max_column + 1):
-            cell_value = ws.cell(row=row_idx, column=col_idx).value
-            if isinstance(cell_value, str):
-                if '产品型号' in cell_value and not product_model_col_idx:
-                    product_model_col_idx = col_idx
-                    print(f"在第 {row_idx} 行找到产品型号列，列索引: {product_model_col_idx}")
-                elif '所需数量' in cell_value and not required_qty_col_idx:
-                    required_qty_col_idx = col_idx
-                    print(f"在第 {row_idx} 行找到所需数量列，列索引: {required_qty_col_idx}")
-        # 如果都找到了，就退出循环
-        if product_model_col_idx and required_qty_col_idx:
-            break
+    # 与 Web 界面使用同一套列名关键词和数据起始行识别
+    col_info = detect_column_info(ws, max_row, max_col)
+    product_model_col_idx = col_info['product_model_col_idx']
+    required_qty_col_idx = col_info['target_col_idx']
+    data_start_row = col_info['data_start_row']
     
     print(f"识别到的产品型号列索引: {product_model_col_idx}")
     print(f"识别到的所需数量列索引: {required_qty_col_idx}")
+    print(f"识别到的数据起始行: {data_start_row}")
+    if not product_model_col_idx:
+        print("错误：未找到产品型号列")
+        return
     
-    if product_model_col_idx and required_qty_col_idx:
+    # 按目标值表达式计算的索引有多列，每列写入订单表中同名的列
+    headers = target_headers(getattr(model_diff_map, 'columns', (LEGACY_VALUE_COLUMN,)))
+    multi_column = uses_value_exprs(model_diff_map)
+    if multi_column:
+        found = find_header_columns(ws, headers, max(1, data_start_row - 1), max_col)
+        for header in headers:
+            if header in found:
+                print(f"找到目标列 {header}，列索引: {found[header]}")
+            else:
+                print(f"警告：订单表中未找到目标列 {header}，该列不写入")
+        target_cols = [found.get(header) for header in headers]
+    else:
+        target_cols = [required_qty_col_idx]
+    
+    if any(target_cols):
         # 合并数据
         print("根据产品型号合并数据...")
         
-        # 创建产品型号到差值的映射
-        model_diff_map = df_source.set_index('产品型号')['差值'].to_dict()
         print(f"源文件中找到 {len(model_diff_map)} 个产品型号与差值映射")
         
-        # 更新目标文件中的所需数量列（从第四行开始，因为第一行是标题，第二行是列名，第三行是分类）
+        # 已确认的型号别名加入精确匹配索引
+        alias_count = apply_aliases(model_diff_map, load_aliases())
+        if alias_count:
+            print(f"应用型号别名 {alias_count} 个")
+        
+        # 更新目标文件中的所需数量列（从识别到的数据起始行开始）
         updated_count = 0
-        max_row = ws.max_row
-        print(f"开始更新数据，从第4行到第{max_row}行")
+        negative_count = 0
+        print(f"开始更新数据，从第{data_start_row}行到第{max_row}行")
         
         # 遍历数据行，只修改所需数量列
-        for row in range(4, max_row + 1):
+        for row in range(data_start_row, max_row + 1):
             # 获取产品型号
             model = ws.cell(row=row, column=product_model_col_idx).value
             
             # 只在找到匹配的产品型号时更新
-            if model and model in model_diff_map:
+            if model and model in model_diff_map and multi_column:
+                # 一次遍历写入全部目标列，空值不写
+                written = []
+                for header, col_idx, value in zip(headers, target_cols, model_diff_map.row(model)):
+                    if col_idx and value == value:
+                        ws.cell(row=row, column=col_idx).value = value
+                        written.append(f"{header}={value}")
+                if written:
+                    print(f"更新产品型号 {model}: {', '.join(written)}")
+                    updated_count += 1
+            elif model and model in model_diff_map:
                 diff_value = model_diff_map[model]
+                # 差值为空（ERP中数量缺失）时保留原值
+                if diff_value != diff_value:
+                    print(f"跳过产品型号 {model}：差值为空")
+                    continue
+                # 与 Web 界面一致，差值为负（库存已够）时不写入
+                if diff_value < 0:
+                    negative_count += 1
+                    continue
                 # 直接写入值，保留原始格式
                 ws.cell(row=row, column=required_qty_col_idx).value = diff_value
                 print(f"更新产品型号 {model} 的所需数量为 {diff_value}")
                 updated_count += 1
         
-        print(f"数据更新完成，共更新了 {updated_count} 个单元格")
+        print(f"数据更新完成，共更新了 {updated_count} 个单元格，跳过 {negative_count} 个负数")
         print(f"文件中图片数量: {len(ws._images)}")
         
         # 保存更新后的文件
@@ -178,8 +364,183 @@ def main():
         print(f"文件更新成功！共更新了 {updated_count} 个产品型号")
         print("提示：文件是通过复制原始文件后修改的，图片数据应该已经保留")
         print("注意：openpyxl可能无法正确显示嵌入图片，但图片数据应该仍然存在于文件中")
+        return updated_count
     else:
-        print("错误：未找到合适的产品型号列或所需数量列")
+        print("错误：未找到合适的所需数量列")
+
+# 监视模式忽略的临时文件（Excel锁文件、隐藏文件、下载中的文件）
+TEMP_FILE_PATTERNS = ('~$*', '.*', '*.tmp', '*.part', '*.crdownload')
+ERP_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+ORDER_EXTENSIONS = ('.xlsx',)
+
+def list_watch_files(directory, extensions):
+    """列出目录中需要处理的文件"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    paths = []
+    for name in names:
+        if any(fnmatch.fnmatch(name, pattern) for pattern in TEMP_FILE_PATTERNS):
+            continue
+        path = os.path.join(directory, name)
+        if name.lower().endswith(extensions) and os.path.isfile(path):
+            paths.append(path)
+    return paths
+
+class FileSettler:
+    """文件防抖：大小和修改时间连续 settle 秒不变才视为写入完成"""
+    def __init__(self, settle):
+        self.settle = settle
+        self.pending = {}
+        self.done = {}
+    
+    def poll(self, paths):
+        """返回本次新写入完成（或写入完成后又被修改）的文件"""
+        now = time.time()
+        ready = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.done.get(path) == signature:
+                continue
+            if path not in self.pending or self.pending[path][0] != signature:
+                self.pending[path] = (signature, now)
+            elif now - self.pending[path][1] >= self.settle:
+                del self.pending[path]
+                self.done[path] = signature
+                ready.append(path)
+        for path in list(self.done):
+            if path not in paths:
+                del self.done[path]
+        return ready
+
+def _start_observer(directories, wake):
+    """有 watchdog 时使用文件系统事件唤醒轮询，否则返回 None 仅靠定时轮询"""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+    
+    class WakeHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+    
+    observer = Observer()
+    for directory in directories:
+        observer.schedule(WakeHandler(), directory, recursive=False)
+    observer.start()
+    return observer
+
+def _process_sheet_job(index_path, target_file, output_file):
+    """工作进程：映射共享索引并处理一个订单表，处理日志写入输出文件旁的 .log 文件"""
+    started = time.time()
+    log_file = f'{os.path.splitext(output_file)[0]}.log'
+    result = {'order_file': target_file, 'output_file': output_file, 'log_file': log_file}
+    with open(log_file, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        try:
+            updated_count = update_order_sheet(attach_index(index_path), target_file, output_file)
+        except Exception as e:
+            print(f"处理失败: {e}")
+            updated_count = None
+    result['updated_count'] = updated_count
+    result['status'] = 'ok' if updated_count is not None else 'failed'
+    result['seconds'] = round(time.time() - started, 3)
+    return result
+
+def run_batch(pool, index_path, snapshot, version, order_files, output_dir, trigger):
+    """在进程池中处理一批订单表，并写出运行报告"""
+    started_at = datetime.now()
+    futures = []
+    for order_file in sorted(order_files):
+        output_file = os.path.join(output_dir, os.path.basename(get_timestamped_filename(order_file)))
+        futures.append((order_file, pool.submit(_process_sheet_job, index_path, order_file, output_file)))
+    
+    results = []
+    for order_file, future in futures:
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'order_file': order_file, 'status': 'failed', 'error': str(e)}
+        results.append(result)
+        print(f"[{result['status']}] {order_file} -> {result.get('output_file', '-')}，更新 {result.get('updated_count')} 个")
+    
+    report = {
+        'trigger': trigger,
+        'erp_snapshot': snapshot,
+        'index_version': version,
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'sheets': results,
+    }
+    report_file = os.path.join(output_dir, f"run_{started_at.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"运行报告: {report_file}")
+    return report
+
+def watch_folders(from_dir, dist_dir, output_dir, interval=2.0, settle=3.0, workers=None, chunksize=0,
+                  lean_max_bytes=LEAN_SOURCE_MAX_BYTES, value_specs=None):
+    """监视ERP目录和订单表目录
+
+    有新的ERP快照时用进程池重新处理全部订单表；有新的订单表时只处理该订单表。
+    ERP索引发布为共享索引文件，工作进程直接映射，无需各自解析ERP导出。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    index_path = os.path.join(output_dir, '.erp_snapshot.idx')
+    print(f"监视ERP目录: {from_dir}")
+    print(f"监视订单表目录: {dist_dir}")
+    print(f"输出目录: {output_dir}")
+    
+    import threading
+    from concurrent.futures import ProcessPoolExecutor
+    
+    wake = threading.Event()
+    observer = _start_observer([d for d in (from_dir, dist_dir) if os.path.isdir(d)], wake)
+    print("使用文件系统事件监视" if observer else f"使用轮询监视（每 {interval} 秒）")
+    
+    erp_settler = FileSettler(settle)
+    order_settler = FileSettler(settle)
+    snapshot = None
+    version = None
+    pending_orders = set()
+    
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                ready_erp = erp_settler.poll(list_watch_files(from_dir, ERP_EXTENSIONS))
+                pending_orders.update(order_settler.poll(list_watch_files(dist_dir, ORDER_EXTENSIONS)))
+                trigger = 'order'
+                
+                if ready_erp:
+                    latest = max(erp_settler.done, key=lambda path: erp_settler.done[path][1])
+                    print(f"检测到ERP快照: {latest}")
+                    model_diff_map = load_model_map(latest, chunksize, lean_max_bytes, value_specs)
+                    if model_diff_map is not None:
+                        if not isinstance(model_diff_map, ModelIndex):
+                            model_diff_map = ModelIndex.from_mapping(model_diff_map)
+                        version = publish_index(model_diff_map, index_path)
+                        snapshot = latest
+                        trigger = 'erp'
+                        pending_orders = set(order_settler.done)
+                
+                if snapshot and pending_orders:
+                    run_batch(pool, index_path, snapshot, version, pending_orders, output_dir, trigger)
+                    pending_orders = set()
+                
+                busy = erp_settler.pending or order_settler.pending
+                wake.wait(interval if busy or observer is None else max(interval, 60))
+                wake.clear()
+    except KeyboardInterrupt:
+        print("停止监视")
+    finally:
+        if observer:
+            observer.stop()
+            observer.join()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,32 @@
+def _has_value(value):
+    if value is None:
+        return False
+    return not (isinstance(value, str) and not value.strip())
+
+
+def used_range(ws):
+    """返回工作表中实际有数据的最后一行和最后一列 (max_row, max_col)，空表返回 (0, 0)
+
+    ws.max_row / ws.max_column 会把只设置了格式的单元格也算进去，
+    整行或整列设置过格式的表格可能达到上万行、XFD 列，遍历和选项列表都应以此为界。
+    """
+    max_row = max_col = 0
+    cells = getattr(ws, '_cells', None)
+    if cells is not None:
+        # 普通工作表：只看已存在的单元格，不逐格探测
+        for (row, col), cell in cells.items():
+            if _has_value(cell.value):
+                if row > max_row:
+                    max_row = row
+                if col > max_col:
+                    max_col = col
+        return max_row, max_col
+
+    # 只读工作表没有单元格字典，按行扫描一遍
+    for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
+        for col_idx, value in enumerate(row, 1):
+            if _has_value(value):
+                max_row = row_idx
+                if col_idx > max_col:
+                    max_col = col_idx
+    return max_row, max_col
@@ -0,0 +1,53 @@
+"""回填工具读取源文件的函数
+
+在独立模块中定义，才能交给进程池执行：pandas 解析 Excel 的大部分时间持有 GIL，
+多个文件用线程池读取并不能并行。参数和返回值都是字节、整数和 DataFrame，可以在进程间传递。
+"""
+import time
+from io import BytesIO
+
+import openpyxl
+import pandas as pd
+
+
+def read_excel_window(file_bytes, file_name, nrows=None):
+    engine = 'xlrd' if file_name.endswith('.xls') else None
+    return pd.read_excel(BytesIO(file_bytes), header=None, nrows=nrows, engine=engine)
+
+
+def read_mapped_columns(file_bytes, file_name, positions, data_start_row):
+    """执行导入时只读取已映射的源列（按列位置），跳过表头部分并向下填充空值
+
+    耗时与映射的列数成正比，与源表总列数无关。按 object 读取、保留单元格原值：
+    跳过表头后若按列推断类型，含空单元格的数字编码列会变成浮点数，加前缀后成为 P10023.0。
+    返回以列位置为列名的 DataFrame。
+    """
+    engine = 'xlrd' if file_name.endswith('.xls') else None
+    positions = sorted(set(positions)) or [0]
+    df = pd.read_excel(BytesIO(file_bytes), header=None, usecols=positions,
+                       skiprows=data_start_row, dtype=object, engine=engine)
+    return df.reindex(columns=positions).ffill()
+
+
+def count_excel_rows(file_bytes, file_name):
+    if file_name.endswith('.xls'):
+        import xlrd
+        return xlrd.open_workbook(file_contents=file_bytes, on_demand=True).sheet_by_index(0).nrows
+    wb = openpyxl.load_workbook(BytesIO(file_bytes), read_only=True)
+    try:
+        return wb.active.max_row
+    finally:
+        wb.close()
+
+
+def read_preview(file_bytes, file_name, nrows):
+    """读取前 nrows 行作为预览窗口，返回 (DataFrame, 总行数)"""
+    df = read_excel_window(file_bytes, file_name, nrows=nrows)
+    return df, count_excel_rows(file_bytes, file_name) or len(df)
+
+
+def read_source_columns(name, file_bytes, positions, data_start_row):
+    """读取一个源文件的映射列，返回 (DataFrame, 耗时秒数)"""
+    start = time.perf_counter()
+    df = read_mapped_columns(file_bytes, name, [pos for pos in positions if pos is not None], data_start_row)
+    return df, time.perf_counter() - start
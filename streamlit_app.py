@@ -8,8 +8,18 @@ from openpyxl.styles import Font, Fill, Border, Alignment, Protection
 from openpyxl.utils import get_column_letter
 import tempfile
 import os
+import time
 import shutil
-import difflib
+from template_registry import find_template, remember_template
+from sheet_range import used_range
+from order_columns import detect_column_info
+from match_stats import collect_match_stats
+from erp_reader import read_erp_table, iter_erp_chunks
+from erp_index import build_model_index, is_index_file, read_index_version, attach_index
+from erp_sqlite import is_erp_snapshot, snapshot_info, snapshot_models, load_snapshot_index
+from model_aliases import load_aliases, add_aliases, apply_aliases, expand_order_models
+from value_exprs import (LEGACY_VALUE_COLUMN, parse_value_exprs, value_calculator, uses_value_exprs,
+                         target_headers, find_header_columns)
 
 def convert_xls_to_xlsx_with_format(xls_content):
     """将 .xls 文件内容转换为 .xlsx 格式，尽可能保留格式"""
@@ -66,54 +76,62 @@ def convert_xls_to_xlsx_with_format(xls_content):
     output.seek(0)
     return output.getvalue()
 
-def detect_column_info(ws):
-    """智能识别订单表的列信息和数据起始行"""
-    product_model_keywords = ['产品型号', '商品货号', '货号', '型号', 'model', 'code']
-    target_column_keywords = ['所需数量', '数量', '订货数量', '进货数量', '数量/个', 'quantity', 'qty']
-    
-    product_model_col_idx = None
-    target_col_idx = None
-    header_row_idx = None
-    data_start_row = None
-    
-    for row_idx in range(1, min(11, ws.max_row + 1)):
-        for col_idx in range(1, ws.max_column + 1):
-            cell_value = ws.cell(row=row_idx, column=col_idx).value
-            if isinstance(cell_value, str):
-                if not product_model_col_idx:
-                    for keyword in product_model_keywords:
-                        if keyword in cell_value:
-                            product_model_col_idx = col_idx
-                            header_row_idx = row_idx
-                            break
-                
-                if not target_col_idx:
-                    for keyword in target_column_keywords:
-                        if keyword in cell_value:
-                            target_col_idx = col_idx
-                            if not header_row_idx:
-                                header_row_idx = row_idx
-                            break
-    
-    if header_row_idx:
-        data_start_row = header_row_idx + 1
-        for row_idx in range(header_row_idx + 1, min(header_row_idx + 5, ws.max_row + 1)):
-            has_data = False
-            for col_idx in range(1, ws.max_column + 1):
-                cell_value = ws.cell(row=row_idx, column=col_idx).value
-                if cell_value is not None and cell_value != '':
-                    has_data = True
-                    break
-            if has_data:
-                data_start_row = row_idx
-                break
-    
-    return {
-        'product_model_col_idx': product_model_col_idx,
-        'target_col_idx': target_col_idx,
-        'header_row_idx': header_row_idx,
-        'data_start_row': data_start_row
-    }
+def get_header_rows(ws, header_rows):
+    """读取前 header_rows 行的单元格值，用于计算模板指纹"""
+    return [list(row) for row in ws.iter_rows(min_row=1, max_row=header_rows, values_only=True)]
+
+def find_similar_model(target_model, all_models, threshold=0.8):
+    """在订单表型号中查找与目标型号最相似的型号"""
+    import difflib
+
+    # 去除空格后再比较，避免因空格导致相似度降低
+    target_model = target_model.strip()
+    matches = difflib.get_close_matches(target_model, all_models, n=1, cutoff=threshold)
+    if not matches:
+        return None, 0
+    return matches[0], difflib.SequenceMatcher(None, target_model, matches[0]).ratio()
+
+def score_missing_models(models):
+    """计算缺失型号的相似推荐，结果缓存在会话中，翻页和导出时不重复计算"""
+    cache = st.session_state.setdefault('similarity_cache', {})
+    order_models = st.session_state.get('order_models', [])
+    rows = []
+    for model in models:
+        if model not in cache:
+            cache[model] = find_similar_model(model, order_models)
+        similar_model, ratio = cache[model]
+        rows.append((model, similar_model, round(ratio * 100) if similar_model else None))
+    return rows
+
+@st.cache_resource
+def shared_index_holder(path):
+    """进程内共用的共享索引映射，所有会话只映射一次"""
+    return {'index': None}
+
+def load_shared_index(path):
+    """取共享索引的会话视图，索引文件被新快照替换时自动重新映射"""
+    holder = shared_index_holder(path)
+    holder['index'] = attach_index(path, holder['index'])
+    return holder['index'].view()
+
+def list_erp_models(kind, path):
+    """读取共享索引或ERP快照中的全部产品型号，只在需要缺失型号报表时调用"""
+    if kind == 'snapshot':
+        return snapshot_models(path)
+    return load_shared_index(path).keys()
+
+def find_missing_models(erp_models, order_models):
+    """ERP中有但订单表中没有的型号；通过别名已匹配到订单表的ERP型号不算缺失，只对真正的新型号做相似度搜索"""
+    aliased_models = {erp_model for erp_model, order_model in load_aliases().items() if order_model in order_models}
+    return sorted(set(erp_models) - order_models - aliased_models)
+
+def reset_missing_page():
+    st.session_state['missing_page'] = 1
+    clear_missing_selection()
+
+def clear_missing_selection():
+    """表格的选中行按控件 key 保存、与数据无关，换页或筛选后需清空，否则会指向别的行"""
+    st.session_state.pop('missing_table', None)
 
 def get_column_name(ws, col_idx, row_idx):
     """获取指定列在指定行的名称"""
@@ -133,8 +151,28 @@ st.markdown("### 📁 文件上传")
 
 col1, col2 = st.columns(2)
 
+# 多进程部署时可通过 ERP_INDEX_PATH 指定 process_excel.py --publish-index 发布的共享索引
+shared_index_path = os.environ.get('ERP_INDEX_PATH')
+use_shared_index = False
+# ERP_SQLITE_PATH 指定 erp_sqlite.py 落地的ERP快照，处理时只查询订单表中出现的型号
+erp_db_path = os.environ.get('ERP_SQLITE_PATH')
+use_erp_db = False
+
 with col1:
     st.markdown("#### ERP库存表（from文件）")
+    if shared_index_path and is_index_file(shared_index_path):
+        use_shared_index = st.checkbox(
+            f"使用共享ERP索引（版本 {read_index_version(shared_index_path)}）",
+            value=True,
+            help="直接使用已发布的ERP产品型号索引，无需上传ERP库存表"
+        )
+    if not use_shared_index and erp_db_path and is_erp_snapshot(erp_db_path):
+        erp_db_info = snapshot_info(erp_db_path)
+        use_erp_db = st.checkbox(
+            f"使用ERP数据库快照（{erp_db_info.get('landed_at', '')}，共 {erp_db_info['models']} 个产品型号）",
+            value=True,
+            help="从本地 SQLite 快照中只查询订单表中出现的产品型号，无需上传ERP库存表"
+        )
     from_file = st.file_uploader(
         "上传ERP库存表",
         type=['xlsx', 'xls', 'csv'],
@@ -183,14 +221,27 @@ if dist_file:
     try:
         wb_preview = load_workbook(tmp_preview_path, data_only=False, keep_links=True)
         ws_preview = wb_preview.active
+        # 列选项和行号范围以实际有数据的区域为界
+        used_rows, used_cols = used_range(ws_preview)
+        
+        template_entry = find_template(
+            'order',
+            lambda entry: get_header_rows(ws_preview, entry['layout']['header_rows'])
+        )
+        if template_entry:
+            col_info = {key: template_entry.get(key) for key in
+                        ('product_model_col_idx', 'target_col_idx', 'header_row_idx', 'data_start_row')}
+            st.success("✅ 识别为已登记的订单表模板，已套用上次确认的列配置")
+        else:
+            col_info = detect_column_info(ws_preview, used_rows, used_cols)
         
-        col_info = detect_column_info(ws_preview)
+        column_count = max(used_cols, col_info['product_model_col_idx'] or 0, col_info['target_col_idx'] or 0, 1)
         
         col1, col2 = st.columns(2)
         
         with col1:
             product_model_options = [f"列{col_idx} - {get_column_name(ws_preview, col_idx, col_info.get('header_row_idx', 1))}" 
-                                   for col_idx in range(1, ws_preview.max_column + 1)]
+                                   for col_idx in range(1, column_count + 1)]
             
             default_product_model_idx = 0
             if col_info['product_model_col_idx']:
@@ -205,7 +256,7 @@ if dist_file:
         
         with col2:
             target_column_options = [f"列{col_idx} - {get_column_name(ws_preview, col_idx, col_info.get('header_row_idx', 1))}" 
-                                    for col_idx in range(1, ws_preview.max_column + 1)]
+                                    for col_idx in range(1, column_count + 1)]
             
             default_target_idx = 0
             if col_info['target_col_idx']:
@@ -221,12 +272,22 @@ if dist_file:
         data_start_row = st.number_input(
             "数据起始行",
             min_value=1,
-            max_value=ws_preview.max_row,
+            max_value=max(used_rows, col_info.get('data_start_row') or 1),
             value=col_info.get('data_start_row', 4),
             help="数据行开始的行号（表头之后的第一个数据行）"
         )
         
-        st.info(f"📊 表格信息: 共 {ws_preview.max_row} 行, {ws_preview.max_column} 列")
+        with st.expander("目标值表达式（可选）", expanded=bool(template_entry and template_entry.get('value_exprs'))):
+            value_exprs_text = st.text_area(
+                "JSON 配置",
+                value=(template_entry or {}).get('value_exprs', ''),
+                placeholder='[{"column": "所需数量", "expr": "`30天销量` - 实际可用数", "multiple": "箱规", "min": 0}]',
+                help="留空时写入 30天销量 - 实际可用数。每项的 column 为订单表中的目标列名（第一项找不到时写入上面选择的目标列），"
+                     "expr 为ERP列的计算表达式（以数字开头的列名用反引号括起），multiple 为箱规倍数（数字或ERP列名），"
+                     "可选 rounding（ceil/floor/round）、min、max、skip_negative"
+            )
+        
+        st.info(f"📊 表格信息: 共 {used_rows} 行, {used_cols} 列（实际有数据的区域）")
         
         st.session_state['preview_file_path'] = tmp_preview_path
         st.session_state['dist_file_ext'] = dist_file_ext
@@ -242,8 +303,25 @@ st.markdown("---")
 
 st.markdown("### 🚀 开始处理")
 
-if st.button("开始处理", type="primary", use_container_width=True):
-    if not from_file:
+stream_erp = st.checkbox(
+    "分块读取ERP库存表（适合超大文件）",
+    value=False,
+    help="按行分块读取ERP库存表，只保留产品型号和差值，内存占用只与型号数量有关"
+)
+
+process_col, dry_run_col = st.columns([3, 1])
+with process_col:
+    start_clicked = st.button("开始处理", type="primary", use_container_width=True)
+with dry_run_col:
+    dry_run = st.button(
+        "试运行（只统计）",
+        use_container_width=True,
+        help="只统计将更新、跳过负数和ERP中没有的型号数量，不生成输出文件"
+    )
+
+if start_clicked or dry_run:
+    started = time.perf_counter()
+    if not from_file and not use_shared_index and not use_erp_db:
         st.error("❌ 请先上传ERP库存表（from文件）")
         st.stop()
     
@@ -258,203 +336,368 @@ if st.button("开始处理", type="primary", use_container_width=True):
     product_model_col_idx = int(product_model_column.split('-')[0].replace('列', ''))
     target_col_idx = int(target_column_select.split('-')[0].replace('列', ''))
     
+    try:
+        value_specs = parse_value_exprs(value_exprs_text)
+    except ValueError as e:
+        st.error(f"❌ {str(e)}")
+        st.stop()
+    
     with st.spinner("正在处理数据..."):
         try:
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            status_text.text("📖 读取ERP库存表...")
-            progress_bar.progress(10)
-            
-            try:
-                df_source = pd.read_excel(from_file, header=1)
-                status_text.text(f"✅ 成功读取ERP库存表，共 {len(df_source)} 行数据")
-            except Exception as e:
-                st.error(f"❌ 读取ERP库存表失败: {str(e)}")
-                st.stop()
-            
-            progress_bar.progress(30)
-            
-            status_text.text("🔍 提取产品型号...")
-            
-            merchant_code_cols = [col for col in df_source.columns if '商家' in col and '编码' in col]
-            
-            if not merchant_code_cols:
-                st.error("❌ 未在ERP库存表中找到商家编码列")
-                st.stop()
-            
-            def extract_model(code):
-                if isinstance(code, str) and '-' in code:
-                    parts = code.split('-')
-                    if len(parts) >= 2:
-                        # 去除空格，避免因空格导致无法匹配
-                        return '-'.join(parts[1:]).strip()
-                return None
-            
-            for col in merchant_code_cols:
-                df_source[f'产品型号_{col}'] = df_source[col].apply(extract_model)
-            
-            model_cols = [col for col in df_source.columns if '产品型号_' in col]
-            
-            if not model_cols:
-                st.error("❌ 未能提取任何产品型号")
-                st.stop()
-            
-            df_source['产品型号'] = df_source[model_cols[0]].apply(lambda x: x.strip() if isinstance(x, str) else x)
-            for col in model_cols[1:]:
-                df_source['产品型号'] = df_source['产品型号'].fillna(df_source[col].apply(lambda x: x.strip() if isinstance(x, str) else x))
-            
-            erp_models = set(df_source['产品型号'].dropna().unique())
-            status_text.text(f"✅ 成功提取产品型号，共 {len(erp_models)} 个")
-            progress_bar.progress(50)
-            
-            status_text.text("📊 计算差值...")
-            
-            if '实际可用数' not in df_source.columns or '30天销量' not in df_source.columns:
-                st.error("❌ ERP库存表中缺少'实际可用数'或'30天销量'列")
-                st.stop()
-            
-            df_source['差值'] = df_source['30天销量'] - df_source['实际可用数']
-            status_text.text(f"✅ 成功计算差值")
-            progress_bar.progress(60)
-            
-            status_text.text("📖 读取订单表...")
-            
-            try:
-                if 'preview_file_path' in st.session_state and os.path.exists(st.session_state['preview_file_path']):
-                    tmp_dist_path = st.session_state['preview_file_path']
-                    file_ext = st.session_state.get('dist_file_ext', 'xlsx')
-                else:
-                    dist_content = dist_file.getvalue()
-                    file_ext = dist_file.name.lower().split('.')[-1] if dist_file.name else 'xlsx'
-                    
-                    if file_ext == 'xls':
-                        status_text.text("🔄 转换 .xls 为 .xlsx 格式...")
-                        dist_content = convert_xls_to_xlsx_with_format(dist_content)
-                    
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_dist:
-                        tmp_dist.write(dist_content)
-                        tmp_dist_path = tmp_dist.name
+            if use_shared_index:
+                status_text.text("📖 映射共享ERP索引...")
+                try:
+                    model_diff_map = load_shared_index(shared_index_path)
+                except (OSError, ValueError) as e:
+                    st.error(f"❌ 读取共享ERP索引失败: {str(e)}")
+                    st.stop()
                 
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_output:
-                    tmp_output_path = tmp_output.name
+                # 列出全部型号要逐个解码映射中的键，缺失型号报表在用户点开时才计算
+                erp_models = None
+                missing_source = ('index', shared_index_path)
+                status_text.text(f"✅ 共享ERP索引版本 {model_diff_map.version}，共 {len(model_diff_map)} 个产品型号")
+                progress_bar.progress(60)
+            elif use_erp_db:
+                # 只按订单表中的型号（及其别名对应的ERP型号）查询快照
+                status_text.text("📖 查询ERP数据库快照...")
+                progress_bar.progress(10)
                 
-                shutil.copy2(tmp_dist_path, tmp_output_path)
+                order_model_values = ws_preview.iter_rows(
+                    min_row=data_start_row, max_row=max(used_rows, data_start_row),
+                    min_col=product_model_col_idx, max_col=product_model_col_idx, values_only=True
+                )
+                order_model_set = {value.strip() for (value,) in order_model_values if isinstance(value, str) and value.strip()}
+                if not order_model_set:
+                    st.error("❌ 订单表的产品型号列中没有读取到型号，请检查产品型号列和数据起始行")
+                    st.stop()
+                wanted_models = expand_order_models(order_model_set, load_aliases())
+                try:
+                    model_diff_map = load_snapshot_index(erp_db_path, wanted_models, *value_calculator(value_specs))
+                except KeyError:
+                    st.error("❌ ERP数据库快照中缺少'实际可用数'或'30天销量'列")
+                    st.stop()
+                except Exception as e:
+                    st.error(f"❌ 查询ERP数据库快照失败: {str(e)}")
+                    st.stop()
                 
-                wb = load_workbook(tmp_output_path, data_only=False, keep_links=True)
-                ws = wb.active
+                # 缺失型号报表需要扫描快照的全部型号，在用户点开时才计算
+                erp_models = None
+                missing_source = ('snapshot', erp_db_path)
+                status_text.text(f"✅ 订单表 {len(wanted_models)} 个产品型号，在快照中找到 {len(model_diff_map)} 个")
+                progress_bar.progress(60)
+            else:
+                # 整表读取与分块读取都经由同一个计算函数建成紧凑的型号索引
+                compute_values, value_columns, usecols = value_calculator(value_specs)
+                progress_bar.progress(10)
                 
-                status_text.text(f"✅ 成功读取订单表，工作表名称: {ws.title}")
-            except Exception as e:
-                error_msg = str(e)
-                if "does not support the old .xls file format" in error_msg.lower():
-                    st.error("❌ 订单表文件格式不支持：")
-                    st.error("openpyxl 库不支持旧的 .xls 文件格式")
-                    st.info("💡 解决方案：请将 .xls 文件转换为 .xlsx 格式")
-                    st.info("💡 转换方法：在 Excel 中打开文件，然后选择'文件 > 另存为 > Excel 工作簿 (.xlsx)'")
-                elif "no valid workbook part" in error_msg.lower():
-                    st.error("❌ 订单表文件格式不正确：")
-                    st.error("该文件不是有效的 Excel (.xlsx) 格式")
-                    st.info("💡 请确保上传的是 Excel 文件，而不是 CSV 或其他格式文件")
-                    st.info("💡 如果是 CSV 文件，请先将其转换为 Excel 格式")
+                try:
+                    if stream_erp:
+                        status_text.text("📖 分块读取ERP库存表...")
+                        chunks = iter_erp_chunks(from_file, header=1, usecols=usecols)
+                    else:
+                        status_text.text("📖 读取ERP库存表...")
+                        chunks = [read_erp_table(from_file, header=1, usecols=usecols)]
+                        status_text.text(f"✅ 成功读取ERP库存表，共 {len(chunks[0])} 行数据")
+                        progress_bar.progress(30)
+                    model_diff_map = build_model_index(chunks, compute_values, value_columns)
+                except KeyError:
+                    st.error("❌ ERP库存表中缺少'实际可用数'或'30天销量'列")
+                    st.stop()
+                except ValueError as e:
+                    st.error(f"❌ {str(e)}")
+                    st.stop()
+                except Exception as e:
+                    st.error(f"❌ 读取ERP库存表失败: {str(e)}")
+                    st.stop()
+                
+                erp_models = set(model_diff_map)
+                status_text.text(f"✅ 成功提取产品型号并计算{'目标值' if value_specs else '差值'}，共 {len(erp_models)} 个")
+                progress_bar.progress(60)
+            
+            if dry_run:
+                # 试运行只读取预览时已加载的型号列，不复制、不写入订单表
+                status_text.text("🔍 统计匹配情况...")
+                alias_count = apply_aliases(model_diff_map, load_aliases())
+                value_headers = target_headers(getattr(model_diff_map, 'columns', (LEGACY_VALUE_COLUMN,)))
+                multi_column = uses_value_exprs(model_diff_map)
+                order_model_values = ws_preview.iter_rows(
+                    min_row=data_start_row, max_row=max(used_rows, data_start_row),
+                    min_col=product_model_col_idx, max_col=product_model_col_idx, values_only=True
+                )
+                value_cols = None
+                if multi_column:
+                    # 与写入时一样解析目标列，订单表中没有对应列的值不计入将更新的行
+                    found_cols = find_header_columns(ws_preview, value_headers, max(1, data_start_row - 1), used_cols)
+                    value_cols = [found_cols.get(header) for header in value_headers]
+                    value_cols[0] = value_cols[0] or target_col_idx
+                stats = collect_match_stats(
+                    [value.strip() for (value,) in order_model_values if isinstance(value, str)],
+                    model_diff_map, multi_column=multi_column, skip_negative=True, target_cols=value_cols
+                )
+                progress_bar.progress(100)
+                status_text.text("✅ 试运行完成，未生成输出文件")
+                
+                st.success(f"🔍 试运行完成（耗时 {time.perf_counter() - started:.2f} 秒）：订单表 {stats['rows']} 行、"
+                           f"{stats['models']} 个产品型号，将更新 {stats['written']} 行")
+                if alias_count:
+                    st.info(f"📊 已应用型号别名: {alias_count} 个")
+                st.info(f"📊 匹配到的行数: {stats['matched']}")
+                if multi_column:
+                    missing_headers = [h for h, col_idx in zip(value_headers, value_cols) if not col_idx]
+                    if missing_headers:
+                        st.warning(f"⚠️ 订单表中未找到目标列: {', '.join(missing_headers)}，这些列不写入")
+                    st.info(f"📊 目标值全部为空、不写入的行数: {stats['empty']}")
                 else:
-                    st.error(f"❌ 读取订单表失败: {error_msg}")
-                st.stop()
-            
-            progress_bar.progress(70)
-            
-            status_text.text("🔍 使用配置的列信息...")
-            
-            st.info(f"📍 产品型号列: {product_model_column}")
-            st.info(f"📍 目标列: {target_column_select}")
-            st.info(f"📍 数据起始行: {data_start_row}")
-            
-            progress_bar.progress(80)
-            
-            status_text.text("🔄 更新数据...")
-            
-            model_diff_map = df_source.set_index('产品型号')['差值'].to_dict()
-            
-            st.info(f"📊 ERP库存表中产品型号数量: {len(model_diff_map)}")
-            st.info(f"📊 ERP库存表中差值≥0的产品数量: {sum(1 for v in model_diff_map.values() if v >= 0)}")
-            
-            order_models = set()
-            updated_count = 0
-            skipped_count = 0
-            matched_but_negative_count = 0
-            
-            for row in range(data_start_row, ws.max_row + 1):
-                model = ws.cell(row=row, column=product_model_col_idx).value
-
-                if model:
-                    # 去除前后空格，避免因空格导致无法匹配
-                    model = model.strip()
-                    order_models.add(model)
-                    if model in model_diff_map:
-                        diff_value = model_diff_map[model]
-                        if diff_value >= 0:
-                            ws.cell(row=row, column=target_col_idx).value = diff_value
-                            updated_count += 1
-                        else:
-                            matched_but_negative_count += 1
-            
-            st.info(f"📊 订单表中产品型号数量: {len(order_models)}")
-            st.info(f"📊 匹配到但差值为负数的产品数量: {matched_but_negative_count}")
-            status_text.text(f"✅ 数据更新完成，共更新了 {updated_count} 个单元格，跳过 {matched_but_negative_count} 个负数")
-            progress_bar.progress(90)
-            
-            status_text.text("💾 保存文件...")
-            wb.save(tmp_output_path)
-            
-            with open(tmp_output_path, 'rb') as f:
-                st.session_state['output_file'] = f.read()
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            st.session_state['output_filename'] = f"订单表_更新_{timestamp}.xlsx"
+                    st.info(f"📊 匹配到但差值为负数、将跳过的行数: {stats['negative']}")
+                st.info(f"📊 ERP库存表中没有的行数: {stats['missing']}（{len(stats['missing_models'])} 个产品型号）")
+                if stats['missing_models']:
+                    with st.expander("查看ERP库存表中没有的产品型号"):
+                        st.dataframe(pd.DataFrame({'产品型号': stats['missing_models']}), use_container_width=True)
+            else:
+                status_text.text("📖 读取订单表...")
             
-            progress_bar.progress(100)
-            status_text.text("✅ 处理完成！")
-            
-            st.success(f"🎉 处理成功！共更新了 {updated_count} 个产品型号，跳过 {skipped_count} 个负数")
-            
-            os.unlink(tmp_output_path)
-            
-            models_in_erp_not_in_order = sorted(erp_models - order_models)
-            
-            if models_in_erp_not_in_order:
-                st.markdown("---")
-                st.markdown("### ⚠️ ERP库存表中有但订单表中没有的产品型号")
-                st.info(f"共找到 {len(models_in_erp_not_in_order)} 个产品型号在ERP库存表中存在，但在订单表中不存在：")
+                try:
+                    if 'preview_file_path' in st.session_state and os.path.exists(st.session_state['preview_file_path']):
+                        tmp_dist_path = st.session_state['preview_file_path']
+                        file_ext = st.session_state.get('dist_file_ext', 'xlsx')
+                    else:
+                        dist_content = dist_file.getvalue()
+                        file_ext = dist_file.name.lower().split('.')[-1] if dist_file.name else 'xlsx'
+                    
+                        if file_ext == 'xls':
+                            status_text.text("🔄 转换 .xls 为 .xlsx 格式...")
+                            dist_content = convert_xls_to_xlsx_with_format(dist_content)
+                    
+                        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_dist:
+                            tmp_dist.write(dist_content)
+                            tmp_dist_path = tmp_dist.name
+                
+                    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_output:
+                        tmp_output_path = tmp_output.name
+                
+                    shutil.copy2(tmp_dist_path, tmp_output_path)
                 
-                def find_similar_model(target_model, all_models, threshold=0.8):
-                    best_match = None
-                    best_ratio = 0
-                    for model in all_models:
-                        # 去除空格后再比较，避免因空格导致相似度降低
-                        ratio = difflib.SequenceMatcher(None, target_model.strip(), model.strip()).ratio()
-                        if ratio >= threshold and ratio > best_ratio:
-                            best_ratio = ratio
-                            best_match = model
-                    return best_match, best_ratio
+                    wb = load_workbook(tmp_output_path, data_only=False, keep_links=True)
+                    ws = wb.active
+                    used_rows, used_cols = used_range(ws)
                 
-                cols_per_row = 5
-                for i in range(0, len(models_in_erp_not_in_order), cols_per_row):
-                    cols = st.columns(cols_per_row)
-                    for j, col in enumerate(cols):
-                        if i + j < len(models_in_erp_not_in_order):
-                            missing_model = models_in_erp_not_in_order[i + j]
-                            similar_model, similarity = find_similar_model(missing_model, order_models)
-                            
-                            if similar_model:
-                                col.markdown(f"**{missing_model}** → {similar_model} ({similarity*100:.0f}%)")
-                            else:
-                                col.markdown(f"**{missing_model}**")
+                    status_text.text(f"✅ 成功读取订单表，工作表名称: {ws.title}")
+                except Exception as e:
+                    error_msg = str(e)
+                    if "does not support the old .xls file format" in error_msg.lower():
+                        st.error("❌ 订单表文件格式不支持：")
+                        st.error("openpyxl 库不支持旧的 .xls 文件格式")
+                        st.info("💡 解决方案：请将 .xls 文件转换为 .xlsx 格式")
+                        st.info("💡 转换方法：在 Excel 中打开文件，然后选择'文件 > 另存为 > Excel 工作簿 (.xlsx)'")
+                    elif "no valid workbook part" in error_msg.lower():
+                        st.error("❌ 订单表文件格式不正确：")
+                        st.error("该文件不是有效的 Excel (.xlsx) 格式")
+                        st.info("💡 请确保上传的是 Excel 文件，而不是 CSV 或其他格式文件")
+                        st.info("💡 如果是 CSV 文件，请先将其转换为 Excel 格式")
+                    else:
+                        st.error(f"❌ 读取订单表失败: {error_msg}")
+                    st.stop()
+            
+                progress_bar.progress(70)
+            
+                status_text.text("🔍 使用配置的列信息...")
+            
+                st.info(f"📍 产品型号列: {product_model_column}")
+                st.info(f"📍 目标列: {target_column_select}")
+                st.info(f"📍 数据起始行: {data_start_row}")
+            
+                progress_bar.progress(80)
+            
+                status_text.text("🔄 更新数据...")
+            
+                st.info(f"📊 ERP库存表中产品型号数量: {len(model_diff_map)}")
+                st.info(f"📊 ERP库存表中差值≥0的产品数量: {sum(1 for v in model_diff_map.values() if v >= 0)}")
+            
+                # 已确认的型号别名加入精确匹配索引
+                aliases = load_aliases()
+                alias_count = apply_aliases(model_diff_map, aliases)
+                if alias_count:
+                    st.info(f"📊 已应用型号别名: {alias_count} 个")
+            
+                # 按目标值表达式计算的索引有多列，每列写入订单表中同名的列
+                value_headers = target_headers(getattr(model_diff_map, 'columns', (LEGACY_VALUE_COLUMN,)))
+                multi_column = uses_value_exprs(model_diff_map)
+                if multi_column:
+                    found_cols = find_header_columns(ws, value_headers, max(1, data_start_row - 1), used_cols)
+                    value_cols = [found_cols.get(header) for header in value_headers]
+                    value_cols[0] = value_cols[0] or target_col_idx
+                    missing_headers = [h for h, col_idx in zip(value_headers, value_cols) if not col_idx]
+                    if missing_headers:
+                        st.warning(f"⚠️ 订单表中未找到目标列: {', '.join(missing_headers)}，这些列不写入")
+                    st.info("📍 目标值列: " + ", ".join(
+                        f"{h} -> 列{col_idx}" for h, col_idx in zip(value_headers, value_cols) if col_idx))
+            
+                order_models = set()
+                updated_count = 0
+                skipped_count = 0
+                matched_but_negative_count = 0
+            
+                for row in range(data_start_row, used_rows + 1):
+                    model = ws.cell(row=row, column=product_model_col_idx).value
+
+                    if model:
+                        # 去除前后空格，避免因空格导致无法匹配
+                        model = model.strip()
+                        order_models.add(model)
+                        if model in model_diff_map and multi_column:
+                            # 一次遍历写入全部目标列，空值不写
+                            written = False
+                            for col_idx, value in zip(value_cols, model_diff_map.row(model)):
+                                if col_idx and value == value:
+                                    ws.cell(row=row, column=col_idx).value = value
+                                    written = True
+                            if written:
+                                updated_count += 1
+                        elif model in model_diff_map:
+                            diff_value = model_diff_map[model]
+                            # 差值为空时保留原值，不计入负数
+                            if diff_value >= 0:
+                                ws.cell(row=row, column=target_col_idx).value = diff_value
+                                updated_count += 1
+                            elif diff_value < 0:
+                                matched_but_negative_count += 1
+            
+                st.info(f"📊 订单表中产品型号数量: {len(order_models)}")
+                st.info(f"📊 匹配到但差值为负数的产品数量: {matched_but_negative_count}")
+                status_text.text(f"✅ 数据更新完成，共更新了 {updated_count} 个单元格，跳过 {matched_but_negative_count} 个负数")
+                progress_bar.progress(90)
+            
+                status_text.text("💾 保存文件...")
+                wb.save(tmp_output_path)
+            
+                with open(tmp_output_path, 'rb') as f:
+                    st.session_state['output_file'] = f.read()
+            
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                st.session_state['output_filename'] = f"订单表_更新_{timestamp}.xlsx"
+            
+                progress_bar.progress(100)
+                status_text.text("✅ 处理完成！")
+            
+                st.success(f"🎉 处理成功！共更新了 {updated_count} 个产品型号，跳过 {skipped_count} 个负数")
+            
+                # 登记本次确认的列配置，下次上传同一模板时直接套用
+                header_rows = col_info.get('header_row_idx') or max(1, data_start_row - 1)
+                try:
+                    remember_template('order', get_header_rows(ws, header_rows), {
+                        'layout': {'header_rows': header_rows},
+                        'product_model_col_idx': product_model_col_idx,
+                        'target_col_idx': target_col_idx,
+                        'header_row_idx': header_rows,
+                        'data_start_row': int(data_start_row),
+                        'value_exprs': value_exprs_text.strip(),
+                    })
+                except OSError as e:
+                    st.warning(f"⚠️ 模板配置登记失败: {str(e)}")
+            
+                os.unlink(tmp_output_path)
+            
+                # 相似度在报表中按页计算并缓存
+                if erp_models is None:
+                    st.session_state['missing_models'] = []
+                    st.session_state['missing_pending'] = missing_source
+                else:
+                    st.session_state['missing_models'] = find_missing_models(erp_models, order_models)
+                    st.session_state.pop('missing_pending', None)
+                st.session_state['order_models'] = sorted(order_models)
+                st.session_state['similarity_cache'] = {}
+                st.session_state.pop('missing_csv', None)
+                # 新的缺失型号列表从第一页开始，上一次的选中行不再有效
+                reset_missing_page()
             
         except Exception as e:
             st.error(f"❌ 处理过程中发生错误: {str(e)}")
             st.exception(e)
             st.stop()
 
+if st.session_state.get('missing_pending'):
+    st.markdown("---")
+    st.markdown("### ⚠️ ERP库存表中有但订单表中没有的产品型号")
+    if st.button("列出ERP库存表中有但订单表中没有的产品型号", use_container_width=True):
+        with st.spinner("正在读取ERP的全部产品型号..."):
+            try:
+                erp_models = list_erp_models(*st.session_state['missing_pending'])
+            except Exception as e:
+                st.error(f"❌ 读取ERP产品型号失败: {str(e)}")
+                st.stop()
+        del st.session_state['missing_pending']
+        st.session_state['missing_models'] = find_missing_models(erp_models, set(st.session_state['order_models']))
+        if st.session_state['missing_models']:
+            st.rerun()
+        st.success("✅ ERP库存表中的产品型号都已出现在订单表中")
+
+if st.session_state.get('missing_models'):
+    missing_models = st.session_state['missing_models']
+    st.markdown("---")
+    st.markdown("### ⚠️ ERP库存表中有但订单表中没有的产品型号")
+    st.info(f"共找到 {len(missing_models)} 个产品型号在ERP库存表中存在，但在订单表中不存在：")
+    
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        search_text = st.text_input("搜索型号", key='missing_search', on_change=reset_missing_page).strip().lower()
+    filtered_models = [m for m in missing_models if search_text in m.lower()] if search_text else missing_models
+    with col2:
+        page_size = st.selectbox("每页行数", options=[50, 100, 200, 500], key='missing_page_size', on_change=reset_missing_page)
+    page_count = max(1, -(-len(filtered_models) // page_size))
+    with col3:
+        page = st.number_input(f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, value=1, key='missing_page',
+                               on_change=clear_missing_selection)
+    
+    page_models = filtered_models[(page - 1) * page_size:page * page_size]
+    page_rows = score_missing_models(page_models)
+    
+    table_event = st.dataframe(
+        pd.DataFrame(page_rows, columns=['ERP产品型号', '相似型号', '相似度']),
+        hide_index=True,
+        use_container_width=True,
+        on_select='rerun',
+        selection_mode='multi-row',
+        key='missing_table',
+        column_config={'相似度': st.column_config.NumberColumn('相似度', format='%d%%')}
+    )
+    
+    selected_pairs = [(page_rows[i][0], page_rows[i][1]) for i in table_event.selection.rows
+                      if i < len(page_rows) and page_rows[i][1]]
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("将选中的相似型号保存为别名", disabled=not selected_pairs, use_container_width=True):
+            add_aliases(selected_pairs)
+            confirmed = {erp_model for erp_model, _ in selected_pairs}
+            st.session_state['missing_models'] = [m for m in missing_models if m not in confirmed]
+            # 列表变了：选中行会指向别的型号，已生成的CSV也包含已保存的型号
+            clear_missing_selection()
+            st.session_state.pop('missing_csv', None)
+            st.session_state['aliases_saved'] = len(selected_pairs)
+            st.rerun()
+    with col2:
+        if 'missing_csv' in st.session_state:
+            st.download_button(
+                "📥 下载完整缺失型号列表（CSV）",
+                data=st.session_state['missing_csv'],
+                file_name=f"缺失型号_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime='text/csv',
+                use_container_width=True
+            )
+        elif st.button("生成完整缺失型号列表（CSV）", use_container_width=True):
+            with st.spinner("正在计算相似度..."):
+                all_rows = score_missing_models(missing_models)
+            st.session_state['missing_csv'] = pd.DataFrame(
+                all_rows, columns=['ERP产品型号', '相似型号', '相似度']
+            ).to_csv(index=False).encode('utf-8-sig')
+            st.rerun()
+
+# 保存别名后会重新运行页面刷新列表，提示在刷新后显示；型号全部保存后列表不再显示，提示放在列表之外
+if 'aliases_saved' in st.session_state:
+    st.success(f"✅ 已保存 {st.session_state.pop('aliases_saved')} 个型号别名，重新点击'开始处理'后生效")
+
 st.markdown("---")
 
 st.markdown("### 📥 下载结果")
@@ -479,7 +722,7 @@ st.markdown("""
 1. **上传ERP库存表**：上传包含库存数据的Excel文件（支持.xlsx, .xls, .csv格式）
 2. **上传订单表**：上传需要更新的订单Excel文件（支持.xlsx和.xls格式）
 3. **配置列信息**：系统会自动识别产品型号列和目标列，您也可以手动选择
-4. **开始处理**：点击按钮开始处理数据
+4. **开始处理**：点击按钮开始处理数据，也可先点击试运行查看匹配统计
 5. **下载结果**：处理完成后，点击下载按钮获取更新后的Excel文件
 
 **注意事项：**
@@ -489,7 +732,7 @@ st.markdown("""
 - 只有非负数的差值才会填入订单表，负数会被跳过
 - 处理后的文件会保留原始格式和图片
 - 会显示ERP库存表中有但订单表中没有的产品型号
-- 对于缺失的型号，会显示订单表中相似度最高的型号（相似度≥80%）
+- 对于缺失的型号，会显示订单表中相似度最高的型号（相似度≥80%），确认后可保存为别名，下次处理时直接匹配
 - 支持多种订单表格式，自动识别产品型号列（如：产品型号、商品货号、货号等）
 - 支持多种目标列（如：所需数量、数量、订货数量、进货数量等）
 - .xls格式文件会自动转换为.xlsx格式进行处理
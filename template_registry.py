@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+from json_store import locked, write_json_atomic
+
+# 模板登记表默认保存在项目目录下，可通过环境变量修改
+DEFAULT_REGISTRY_PATH = os.environ.get(
+    'TEMPLATE_REGISTRY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.template_registry.json')
+)
+
+
+def _normalize_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ''
+        if value.is_integer():
+            value = int(value)
+    return str(value).strip()
+
+
+def header_fingerprint(rows):
+    """根据表头区域（若干行单元格值）计算模板指纹"""
+    digest = hashlib.sha1()
+    for row in rows:
+        cells = [_normalize_cell(v) for v in row]
+        # 去掉行尾空单元格，避免格式化过的空列影响指纹
+        while cells and cells[-1] == '':
+            cells.pop()
+        digest.update('\x1f'.join(cells).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()[:16]
+
+
+def load_registry(path=None):
+    """读取模板登记表，文件不存在或损坏时返回空表"""
+    path = path or DEFAULT_REGISTRY_PATH
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            registry = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return registry if isinstance(registry, dict) else {}
+
+
+def save_registry(registry, path=None):
+    """原子写入模板登记表"""
+    write_json_atomic(path or DEFAULT_REGISTRY_PATH, registry)
+
+
+def find_template(kind, rows_for_entry, path=None):
+    """查找已登记的模板
+
+    rows_for_entry(entry) 需返回该登记项所描述的表头区域各行的值，
+    不同表头布局只计算一次指纹。命中时返回登记项，否则返回 None。
+    """
+    entries = load_registry(path).get(kind, {})
+    checked = {}
+    for entry in entries.values():
+        layout = json.dumps(entry.get('layout', {}), sort_keys=True)
+        if layout in checked:
+            continue
+        try:
+            fingerprint = header_fingerprint(rows_for_entry(entry))
+        except Exception:
+            fingerprint = None
+        checked[layout] = fingerprint
+        if fingerprint in entries:
+            return entries[fingerprint]
+    return None
+
+
+def remember_template(kind, rows, entry, path=None):
+    """登记用户确认过的模板配置，返回模板指纹
+
+    entry 中的 layout 描述表头区域位置，用于下次上传时重新计算指纹。
+    """
+    fingerprint = header_fingerprint(rows)
+    path = path or DEFAULT_REGISTRY_PATH
+    # 加锁后重新读取，多个会话同时登记时不会互相覆盖
+    with locked(path):
+        registry = load_registry(path)
+        registry.setdefault(kind, {})[fingerprint] = entry
+        save_registry(registry, path)
+    return fingerprint
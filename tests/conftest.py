@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# 应用模块都在仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path, monkeypatch):
+    """登记表和别名表的默认路径在模块导入时确定，测试中改到临时目录，不写入项目目录"""
+    import model_aliases
+    import template_registry
+
+    monkeypatch.setattr(template_registry, 'DEFAULT_REGISTRY_PATH', str(tmp_path / 'template_registry.json'))
+    monkeypatch.setattr(model_aliases, 'DEFAULT_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
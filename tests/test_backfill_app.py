@@ -0,0 +1,96 @@
+import io
+import os
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import PatternFill
+from openpyxl.worksheet.datavalidation import DataValidation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def workbook_bytes(rows):
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(tmp_path, monkeypatch):
+    monkeypatch.setenv('TEMPLATE_REGISTRY_PATH', str(tmp_path / 'template_registry.json'))
+
+
+def run_import(sources, template_bytes, mapping, prefix='', stream=False):
+    """在回填应用中导入，返回输出工作簿"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, 'excel_backfill_app.py'), default_timeout=60).run()
+    at.file_uploader(key='source_uploader').set_value(
+        [(f'source{i}.xlsx', workbook_bytes(rows), XLSX_MIME) for i, rows in enumerate(sources)])
+    at.file_uploader(key='target_uploader').set_value(('template.xlsx', template_bytes, XLSX_MIME))
+    at.run()
+    for target, source in mapping.items():
+        at.selectbox(key=f'map_{target}').set_value(source)
+    at.text_input(key='code_prefix').set_value(prefix)
+    at.checkbox(key='stream_mode').set_value(stream)
+    at.run()
+    next(b for b in at.button if b.label == '执行数据导入').click().run()
+    assert not at.exception
+    assert not at.error, [e.value for e in at.error]
+
+    return load_workbook(at.session_state['output_buffer'])
+
+
+def run_backfill(sources, template, mapping, prefix=''):
+    """在回填应用中导入，返回输出工作表的数据行"""
+    ws = run_import(sources, workbook_bytes(template), mapping, prefix).active
+    return [list(row) for row in ws.iter_rows(min_row=2, values_only=True)]
+
+
+def test_numeric_codes_with_blanks_keep_integer_form():
+    source = [['型号', '数量'], [10023, 1], [None, 2], [10025, 3]]
+    rows = run_backfill([source], [['商品编码', '采购数量']], {'商品编码': '型号', '采购数量': '数量'}, prefix='P')
+    assert rows == [['P10023', 1], ['P10023', 2], ['P10025', 3]]
+
+
+def test_numeric_codes_stay_integral_after_merging_file_without_the_column():
+    first = [['型号', '数量'], [10023, 1], [10025, 3]]
+    second = [['数量'], [4]]
+    rows = run_backfill([first, second], [['商品编码', '采购数量']], {'商品编码': '型号', '采购数量': '数量'},
+                        prefix='P')
+    assert rows == [['P10023', 1], ['P10025', 3], [None, 4]]
+
+
+def test_streaming_keeps_other_sheets_validations_and_print_setup():
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '模板'
+    ws.append(['商品编码', '采购数量'])
+    options = wb.create_sheet('选项')
+    options.append(['甲'])
+    validation = DataValidation(type='list', formula1='=选项!$A$1:$A$1')
+    validation.add('B2:B100')
+    ws.add_data_validation(validation)
+    ws.conditional_formatting.add('B2:B100', CellIsRule(operator='lessThan', formula=['0'],
+                                                        fill=PatternFill('solid', bgColor='FF0000')))
+    ws.page_setup.orientation = 'landscape'
+    ws.print_title_rows = '1:1'
+    buffer = io.BytesIO()
+    wb.save(buffer)
+
+    source = [['型号', '数量'], ['A1', 1], ['A2', 2]]
+    out = run_import([source], buffer.getvalue(), {'商品编码': '型号', '采购数量': '数量'}, stream=True)
+
+    assert out.sheetnames == ['模板', '选项']
+    assert out['选项']['A1'].value == '甲'
+    ws = out['模板']
+    assert [list(row) for row in ws.iter_rows(min_row=2, values_only=True)] == [['A1', 1], ['A2', 2]]
+    assert str(ws.data_validations.dataValidation[0].sqref) == 'B2:B100'
+    assert [str(cf.sqref) for cf in ws.conditional_formatting] == ['B2:B100']
+    assert ws.page_setup.orientation == 'landscape'
+    assert ws.print_title_rows == '$1:$1'
@@ -0,0 +1,40 @@
+import threading
+
+from erp_sqlite import land_erp_snapshot, connection, fetch_erp_rows, snapshot_info
+
+
+def write_erp(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('库存导出,,,\n商家编码,商品名称,实际可用数,30天销量\n')
+        for model, available in rows:
+            f.write(f'S-{model},商品{model},{available},10\n')
+
+
+def test_connections_are_reused_across_threads(tmp_path):
+    erp, db = tmp_path / 'erp.csv', str(tmp_path / 'erp.db')
+    write_erp(erp, [('A1', 5)])
+    land_erp_snapshot(str(erp), db)
+
+    seen = []
+
+    def query():
+        with connection(db) as conn:
+            seen.append(id(conn))
+
+    for _ in range(3):
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+    assert len(set(seen)) == 1
+    assert snapshot_info(db)['models'] == 1
+
+
+def test_replaced_snapshot_is_reopened(tmp_path):
+    erp, db = tmp_path / 'erp.csv', str(tmp_path / 'erp.db')
+    write_erp(erp, [('A1', 5)])
+    land_erp_snapshot(str(erp), db)
+    assert fetch_erp_rows(db, ['A1', 'A2'], usecols=None)[1] == [('A1', 'S-A1', '商品A1', 5, 10)]
+
+    write_erp(erp, [('A1', 5), ('A2', 7)])
+    land_erp_snapshot(str(erp), db)
+    assert len(fetch_erp_rows(db, ['A1', 'A2'], usecols=None)[1]) == 2
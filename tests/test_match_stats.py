@@ -0,0 +1,32 @@
+import math
+
+from erp_index import ModelIndex
+from match_stats import collect_match_stats
+
+
+def make_index():
+    index = ModelIndex()
+    index.put('A1', [5.0])
+    index.put('A2', [-10.0])
+    index.put('A3', [math.nan])
+    return index
+
+
+def test_empty_values_are_never_written():
+    stats = collect_match_stats(['A1', 'A2', 'A3', 'B1'], make_index())
+    assert (stats['matched'], stats['written'], stats['negative'], stats['empty']) == (3, 2, 1, 1)
+    assert stats['missing_models'] == ['B1']
+
+
+def test_skip_negative():
+    stats = collect_match_stats(['A1', 'A2', 'A3'], make_index(), skip_negative=True)
+    assert (stats['written'], stats['negative'], stats['empty']) == (1, 1, 1)
+
+
+def test_values_without_target_column_are_not_counted():
+    index = ModelIndex(['所需数量', '箱数'])
+    index.put('A1', [math.nan, 2.0])
+    index.put('A2', [3.0, math.nan])
+
+    stats = collect_match_stats(['A1', 'A2'], index, multi_column=True, target_cols=[5, None])
+    assert (stats['written'], stats['empty']) == (1, 1)
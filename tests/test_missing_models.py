@@ -0,0 +1,47 @@
+import json
+import os
+
+from openpyxl import Workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def test_saving_aliases_clears_selection_and_csv(tmp_path, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.setenv('TEMPLATE_REGISTRY_PATH', str(tmp_path / 'template_registry.json'))
+    monkeypatch.setenv('MODEL_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
+    monkeypatch.delenv('ERP_INDEX_PATH', raising=False)
+    monkeypatch.delenv('ERP_SQLITE_PATH', raising=False)
+    erp = ('库存导出,,,\n商家编码,商品名称,实际可用数,30天销量\n'
+           'S-A1,商品,1,5\nS-AB12,商品,1,5\nS-AB13X,商品,1,5\n').encode('utf-8')
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['订单'])
+    ws.append(['产品型号', '所需数量'])
+    ws.append([None, None])
+    for model in ['A1', 'AB12X', 'AB13']:
+        ws.append([model, None])
+    wb.save(tmp_path / 'order.xlsx')
+
+    at = AppTest.from_file(os.path.join(ROOT, 'streamlit_app.py'), default_timeout=60).run()
+    at.file_uploader(key='from_file').set_value(('erp.csv', erp, 'text/csv'))
+    at.file_uploader(key='dist_file').set_value(('order.xlsx', (tmp_path / 'order.xlsx').read_bytes(), XLSX_MIME))
+    at.run()
+    next(b for b in at.button if b.label == '开始处理').click().run()
+    listing = [b for b in at.button if b.label.startswith('列出')]
+    if listing:
+        listing[0].click().run()
+    assert at.session_state['missing_models'] == ['AB12', 'AB13X']
+
+    at.session_state['missing_csv'] = b'stale'
+    at.session_state['missing_table'] = {'selection': {'rows': [0], 'columns': []}}
+    at.run()
+    next(b for b in at.button if b.label == '将选中的相似型号保存为别名').click().run()
+
+    assert not at.exception
+    assert at.session_state['missing_models'] == ['AB13X']
+    assert 'missing_csv' not in at.session_state
+    assert next(b for b in at.button if b.label == '将选中的相似型号保存为别名').disabled
+    assert json.loads((tmp_path / 'model_aliases.json').read_text(encoding='utf-8')) == {'AB12': 'AB12X'}
@@ -0,0 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from model_aliases import add_aliases, load_aliases
+
+
+def test_concurrent_alias_saves_are_all_kept(tmp_path):
+    path = str(tmp_path / 'model_aliases.json')
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: add_aliases([(f'ERP-{i}', f'P{i}')], path), range(40)))
+
+    assert load_aliases(path) == {f'ERP-{i}': f'P{i}' for i in range(40)}
@@ -0,0 +1,130 @@
+import math
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+from erp_index import ModelIndex
+from process_excel import update_order_sheet, read_order_models, print_dry_run
+from xlsx_diff import assert_only_cells_changed
+
+
+def make_order(path, models):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['订单'])
+    ws.append(['产品型号', '所需数量'])
+    ws.append([None, None])
+    for model in models:
+        ws.append([model, 'keep'])
+    wb.save(path)
+
+
+def written_cells(path):
+    ws = load_workbook(path).active
+    return {model: value for model, value in ws.iter_rows(min_row=4, max_col=2, values_only=True)}
+
+
+def test_single_expr_targeting_required_quantity_keeps_empty_cells(tmp_path, monkeypatch):
+    monkeypatch.setenv('MODEL_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
+    order, output = tmp_path / 'order.xlsx', tmp_path / 'output.xlsx'
+    make_order(order, ['A1', 'A2'])
+    index = ModelIndex(['所需数量'])
+    index.put('A1', [12.0])
+    index.put('A2', [math.nan])
+
+    assert update_order_sheet(index, str(order), str(output)) == 1
+    assert written_cells(output) == {'A1': 12, 'A2': 'keep'}
+
+
+def test_empty_and_negative_diffs_keep_cells(tmp_path, monkeypatch):
+    monkeypatch.setenv('MODEL_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
+    order, output = tmp_path / 'order.xlsx', tmp_path / 'output.xlsx'
+    make_order(order, ['A1', 'A2', 'A3'])
+    index = ModelIndex()
+    index.put('A1', [-3.0])
+    index.put('A2', [math.nan])
+    index.put('A3', [4.0])
+
+    assert update_order_sheet(index, str(order), str(output)) == 1
+    assert written_cells(output) == {'A1': 'keep', 'A2': 'keep', 'A3': 4}
+
+
+def test_read_order_models_detects_header(tmp_path):
+    path = tmp_path / 'order.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['订单'])
+    ws.append([None])
+    ws.append(['商品货号', '数量'])
+    ws.append(['B1', None])
+    ws.append(['B2', None])
+    wb.save(path)
+
+    assert read_order_models(str(path)) == ['B1', 'B2']
+
+
+def test_read_order_models_without_model_column(tmp_path):
+    path = tmp_path / 'order.xlsx'
+    wb = Workbook()
+    wb.active.append(['备注'])
+    wb.save(path)
+
+    with pytest.raises(ValueError):
+        read_order_models(str(path))
+
+
+def test_required_quantity_preferred_over_other_quantity_columns(tmp_path, monkeypatch):
+    monkeypatch.setenv('MODEL_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
+    order, output = tmp_path / 'order.xlsx', tmp_path / 'output.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['订单'])
+    ws.append(['产品型号', '库存数量', '所需数量/个（标箱倍数）'])
+    ws.append([None, None, None])
+    ws.append(['A1', 7, None])
+    wb.save(order)
+    index = ModelIndex()
+    index.put('A1', [12.0])
+
+    assert update_order_sheet(index, str(order), str(output)) == 1
+    ws = load_workbook(output).active
+    assert [cell.value for cell in ws[4]] == ['A1', 7, 12]
+
+
+def test_update_order_sheet_changes_only_target_cells(tmp_path, monkeypatch):
+    monkeypatch.setenv('MODEL_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
+    order, output = tmp_path / 'order.xlsx', tmp_path / 'output.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['订单'])
+    ws.append(['产品型号', '所需数量', '备注'])
+    ws.append([None, None, None])
+    ws.append(['A1', None, '加急'])
+    ws.append(['A2', None, None])
+    ws.merge_cells('A1:C1')
+    ws['A1'].font = Font(bold=True)
+    ws.row_dimensions[2].height = 24
+    ws.column_dimensions['C'].width = 30
+    wb.save(order)
+    index = ModelIndex()
+    index.put('A1', [5.0])
+
+    assert update_order_sheet(index, str(order), str(output)) == 1
+    assert_only_cells_changed(order, output, {(ws.title, 'B4')})
+
+
+def test_dry_run_counts_only_values_with_a_target_column(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('MODEL_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
+    order, output = tmp_path / 'order.xlsx', tmp_path / 'output.xlsx'
+    make_order(order, ['A1', 'A2'])
+    index = ModelIndex(['所需数量', '箱数'])
+    index.put('A1', [math.nan, 2.0])
+    index.put('A2', [3.0, math.nan])
+
+    print_dry_run(index, read_order_models(str(order)), 0.0, str(order))
+    out = capsys.readouterr().out
+    assert '将写入 1 行（目标列: 所需数量）' in out
+    assert '未找到目标列 箱数' in out
+    assert update_order_sheet(index, str(order), str(output)) == 1
+    assert written_cells(output) == {'A1': 'keep', 'A2': 3}
@@ -0,0 +1,131 @@
+import io
+import os
+import struct
+import subprocess
+import sys
+import time
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from erp_index import ModelIndex, publish_index, attach_index
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 型号: (实际可用数, 30天销量)；差值 = 30天销量 - 实际可用数，Web 界面只写入非负数
+ERP_ROWS = {'A1': (5, 10), 'A2': (20, 10), 'A3': (1, 30)}
+EXPECTED = {'A1': 5, 'A2': None, 'A3': 29}
+
+
+def write_erp(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('库存导出,,,\n商家编码,商品名称,实际可用数,30天销量\n')
+        for model, (available, sales) in ERP_ROWS.items():
+            f.write(f'S-{model},商品{model},{available},{sales}\n')
+
+
+def write_order(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['订单'])
+    ws.append(['产品型号', '所需数量'])
+    ws.append([None, None])
+    for model in ERP_ROWS:
+        ws.append([model, None])
+    wb.save(path)
+
+
+def upload(path, mime):
+    with open(path, 'rb') as f:
+        return os.path.basename(path), f.read(), mime
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setenv('TEMPLATE_REGISTRY_PATH', str(tmp_path / 'template_registry.json'))
+    monkeypatch.setenv('MODEL_ALIAS_PATH', str(tmp_path / 'model_aliases.json'))
+    monkeypatch.delenv('ERP_INDEX_PATH', raising=False)
+    monkeypatch.delenv('ERP_SQLITE_PATH', raising=False)
+    erp, order = tmp_path / 'erp.csv', tmp_path / 'order.xlsx'
+    write_erp(erp)
+    write_order(order)
+    return erp, order
+
+
+def run_web_app(order, erp=None):
+    """在 Web 应用中处理订单表，返回写入后的 {型号: 所需数量}"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, 'streamlit_app.py'), default_timeout=60).run()
+    if erp is not None:
+        at.file_uploader(key='from_file').set_value(upload(erp, 'text/csv'))
+    at.file_uploader(key='dist_file').set_value(upload(order, XLSX_MIME))
+    at.run()
+    next(b for b in at.button if b.label == '开始处理').click().run()
+    assert not at.exception
+    assert not at.error, [e.value for e in at.error]
+
+    ws = load_workbook(io.BytesIO(at.session_state['output_file'])).active
+    return {model: value for model, value in ws.iter_rows(min_row=4, max_col=2, values_only=True)}
+
+
+def test_upload_writes_expected_cells(files):
+    erp, order = files
+    assert run_web_app(order, erp=erp) == EXPECTED
+
+
+@pytest.mark.parametrize('options', [[], ['--lean-max-bytes', '0'], ['--chunksize', '2']])
+def test_cli_published_index_matches_upload(files, tmp_path, monkeypatch, options):
+    erp, order = files
+    index_path = tmp_path / 'erp.idx'
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'process_excel.py'), str(erp), str(order),
+         '--publish-index', str(index_path), *options],
+        cwd=tmp_path, check=True, capture_output=True
+    )
+
+    monkeypatch.setenv('ERP_INDEX_PATH', str(index_path))
+    assert run_web_app(order) == EXPECTED
+
+
+def test_watch_published_index_matches_upload(files, tmp_path, monkeypatch):
+    erp, order = files
+    from_dir, dist_dir, output_dir = tmp_path / 'from', tmp_path / 'dist', tmp_path / 'output'
+    from_dir.mkdir()
+    dist_dir.mkdir()
+    index_path = output_dir / '.erp_snapshot.idx'
+
+    watcher = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'process_excel.py'), '--watch', '--from-dir', str(from_dir),
+         '--dist-dir', str(dist_dir), '--output-dir', str(output_dir), '--interval', '0.2', '--settle', '0.2'],
+        cwd=tmp_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        os.replace(erp, from_dir / 'erp.csv')
+        deadline = time.monotonic() + 60
+        while not index_path.exists():
+            assert watcher.poll() is None, '监视进程意外退出'
+            assert time.monotonic() < deadline, '监视模式未发布共享索引'
+            time.sleep(0.2)
+    finally:
+        watcher.terminate()
+        watcher.wait(timeout=30)
+
+    monkeypatch.setenv('ERP_INDEX_PATH', str(index_path))
+    assert run_web_app(order) == EXPECTED
+
+
+def test_old_format_index_is_rejected(tmp_path):
+    index = ModelIndex()
+    index.put('A1', [-5.0])
+    path = tmp_path / 'old.idx'
+    publish_index(index, path)
+
+    # 格式版本 1 的索引差值符号相反
+    data = bytearray(path.read_bytes())
+    struct.pack_into('<I', data, 8, 1)
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError, match='重新发布'):
+        attach_index(path)
@@ -0,0 +1,27 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from template_registry import load_registry, remember_template
+
+
+def test_concurrent_registrations_are_all_kept(tmp_path):
+    path = str(tmp_path / 'registry.json')
+
+    def register(i):
+        return remember_template('order', [[f'表头{i}']], {'header_rows': i}, path)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        fingerprints = list(pool.map(register, range(40)))
+
+    assert set(load_registry(path)['order']) == set(fingerprints)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_registry_keeps_file_permissions(tmp_path):
+    path = str(tmp_path / 'registry.json')
+    remember_template('order', [['表头']], {}, path)
+    assert os.stat(path).st_mode & 0o777 == 0o644
+
+    os.chmod(path, 0o664)
+    remember_template('order', [['表头2']], {}, path)
+    assert os.stat(path).st_mode & 0o777 == 0o664
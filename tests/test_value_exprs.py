@@ -0,0 +1,14 @@
+import math
+
+import pandas as pd
+
+from value_exprs import parse_value_exprs, evaluate_value_exprs
+
+
+def test_invalid_carton_size_leaves_value_empty():
+    df = pd.DataFrame({'实际可用数': [0, 0, 0], '30天销量': [30, 30, 30], '箱规': [12, None, 0]})
+    specs = parse_value_exprs([{'column': '所需数量', 'expr': '`30天销量` - 实际可用数', 'multiple': '箱规'}])
+
+    values = evaluate_value_exprs(df, specs)['所需数量'].tolist()
+    assert values[0] == 36
+    assert math.isnan(values[1]) and math.isnan(values[2])
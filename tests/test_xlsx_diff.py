@@ -0,0 +1,72 @@
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+from xlsx_diff import diff_workbooks, assert_only_cells_changed, main
+
+
+@pytest.fixture
+def original(tmp_path):
+    path = tmp_path / 'original.xlsx'
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '订单'
+    ws.append(['产品型号', '所需数量'])
+    for row in range(1, 6):
+        ws.append([f'P{row}', row])
+    ws.merge_cells('D1:E1')
+    wb.save(path)
+    return path
+
+
+def modified(original, change):
+    wb = load_workbook(original)
+    change(wb.active)
+    path = original.with_name('modified.xlsx')
+    wb.save(path)
+    return path
+
+
+def test_resaved_workbook_has_no_differences(original):
+    report = diff_workbooks(original, modified(original, lambda ws: None))
+    assert not any(report.values())
+
+
+def test_changed_cell_is_reported_and_allowed(original):
+    path = modified(original, lambda ws: ws.cell(3, 2, 99))
+
+    report = assert_only_cells_changed(original, path, {('订单', 'B3')})
+    assert report['cells'] == [('订单', 'B3', 2, 99)]
+    with pytest.raises(AssertionError, match='B3'):
+        assert_only_cells_changed(original, path, set())
+
+
+def test_row_height_change_is_caught(original):
+    path = modified(original, lambda ws: setattr(ws.row_dimensions[4], 'height', 30))
+
+    assert diff_workbooks(original, path)['rows'] == [('订单', 4)]
+    with pytest.raises(AssertionError, match='行属性'):
+        assert_only_cells_changed(original, path, set())
+
+
+def test_row_style_change_is_caught(original):
+    path = modified(original, lambda ws: setattr(ws.row_dimensions[4], 'font', Font(bold=True)))
+
+    assert diff_workbooks(original, path)['rows'] == [('订单', 4)]
+
+
+def test_cell_style_and_merge_changes_are_reported(original):
+    def change(ws):
+        ws['A2'].font = Font(bold=True)
+        ws.unmerge_cells('D1:E1')
+
+    report = diff_workbooks(original, modified(original, change))
+    assert report['styles'] == [('订单', 'A2')]
+    assert ('订单', 'mergeCells') in report['layout']
+
+
+def test_added_row_is_reported(original, capsys):
+    path = modified(original, lambda ws: ws.append(['P6', 6]))
+
+    assert main([str(original), str(path)]) == 1
+    assert "订单!A7: None -> 'P6'" in capsys.readouterr().out
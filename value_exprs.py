@@ -0,0 +1,171 @@
+import json
+import os
+import re
+
+from erp_reader import is_erp_column
+
+# ERP 索引默认只有“差值”一列，写入订单表的“所需数量”列
+LEGACY_VALUE_COLUMN = '差值'
+LEGACY_TARGET_HEADER = '所需数量'
+
+ROUNDING_MODES = ('ceil', 'floor', 'round')
+
+# 表达式中的列名：反引号括起的任意列名，或合法的标识符（中文列名可直接书写）
+_NAME_PATTERN = re.compile(r'`([^`]+)`|([^\W\d]\w*)')
+
+
+def parse_value_exprs(spec):
+    """解析目标值表达式配置，配置有误时抛出 ValueError
+
+    spec 可以是 JSON 文本、JSON 文件路径或已解析的列表，每项形如
+    {"column": "所需数量", "expr": "`30天销量` - 实际可用数", "multiple": "箱规", "min": 0}
+    multiple 为数字时全表按同一倍数取整，为列名时按ERP表中该列（每个SKU的箱规）取整。
+    """
+    if isinstance(spec, str):
+        text = spec.strip()
+        if not text:
+            return []
+        if not text.startswith(('[', '{')) and os.path.isfile(text):
+            with open(text, 'r', encoding='utf-8') as f:
+                text = f.read()
+        try:
+            spec = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f'目标值表达式不是有效的JSON: {e}') from e
+    if isinstance(spec, dict):
+        spec = [spec]
+    if not isinstance(spec, list):
+        raise ValueError('目标值表达式应为列表')
+
+    specs = []
+    for item in spec:
+        if not isinstance(item, dict) or not item.get('column') or not item.get('expr'):
+            raise ValueError('每个目标值表达式都需要 column 和 expr')
+        multiple = item.get('multiple')
+        if multiple is not None and not isinstance(multiple, str):
+            if not isinstance(multiple, (int, float)) or multiple <= 0:
+                raise ValueError(f"{item['column']}: multiple 应为正数或ERP列名")
+        rounding = item.get('rounding', 'ceil')
+        if rounding not in ROUNDING_MODES:
+            raise ValueError(f"{item['column']}: rounding 只能是 {', '.join(ROUNDING_MODES)}")
+        specs.append({
+            'column': str(item['column']).strip(),
+            'expr': str(item['expr']),
+            'multiple': multiple,
+            'rounding': rounding,
+            'min': item.get('min'),
+            'max': item.get('max'),
+            'skip_negative': bool(item.get('skip_negative', False)),
+        })
+
+    columns = [s['column'] for s in specs]
+    if len(set(columns)) != len(columns):
+        raise ValueError('目标值表达式的 column 不能重复')
+    return specs
+
+
+def compute_diff(data):
+    """默认写入订单表的差值：30天销量 - 实际可用数，正数即需要补的数量
+
+    data 可以是ERP数据块（DataFrame）或单行记录（dict），缺少列时抛出 KeyError。
+    """
+    return data['30天销量'] - data['实际可用数']
+
+
+def value_calculator(specs):
+    """建ERP索引用的 (compute_values, columns, usecols)
+
+    有目标值表达式时按表达式计算各目标列，否则只算默认差值；两个应用的各种读取方式和共享索引都经由这里，
+    同一型号算出的值处处一致。
+    """
+    if specs:
+        return (lambda df: evaluate_value_exprs(df, specs)), [spec['column'] for spec in specs], erp_usecols(specs)
+    return compute_diff, (LEGACY_VALUE_COLUMN,), is_erp_column
+
+
+def referenced_columns(specs):
+    """表达式和倍数中引用的ERP列名"""
+    names = set()
+    for spec in specs:
+        for quoted, bare in _NAME_PATTERN.findall(spec['expr']):
+            names.add(quoted or bare)
+        if isinstance(spec['multiple'], str):
+            names.add(spec['multiple'])
+    return names
+
+
+def erp_usecols(specs):
+    """读取ERP库存表时的列筛选函数：默认需要的列加上表达式引用的列"""
+    names = referenced_columns(specs)
+    return lambda name: is_erp_column(name) or str(name) in names
+
+
+def evaluate_value_exprs(df, specs):
+    """在整张ERP表上按列计算各目标值，返回与 df 对齐、以目标列名为列的 DataFrame
+
+    计算顺序：表达式 -> 按倍数取整 -> min/max 限制 -> skip_negative 的负数置空。
+    值为空（NaN）的单元格不写入订单表；倍数列（箱规）为空或不为正数的SKU结果也为空。
+    """
+    import numpy as np
+    import pandas as pd
+
+    names = referenced_columns(specs)
+    frame = pd.DataFrame(
+        {col: pd.to_numeric(df[col], errors='coerce') for col in df.columns if col in names},
+        index=df.index
+    )
+
+    result = pd.DataFrame(index=df.index)
+    for spec in specs:
+        try:
+            values = frame.eval(spec['expr'])
+        except Exception as e:
+            raise ValueError(f"目标值表达式计算失败（{spec['column']}: {spec['expr']}）: {e}") from e
+        if not isinstance(values, pd.Series):
+            values = pd.Series(values, index=df.index)
+        # 除以 0 等得到的无穷大视为无法计算
+        values = pd.to_numeric(values, errors='coerce').astype('float64').replace([np.inf, -np.inf], np.nan)
+
+        multiple = spec['multiple']
+        if multiple is not None:
+            if isinstance(multiple, str):
+                if multiple not in frame.columns:
+                    raise ValueError(f"{spec['column']}: ERP库存表中没有倍数列 '{multiple}'")
+                # 箱规缺失或不为正数的SKU无法取整，结果为空，订单表中该单元格保持原样
+                multiple = frame[multiple].where(frame[multiple] > 0)
+            rounder = {'ceil': np.ceil, 'floor': np.floor, 'round': np.round}[spec['rounding']]
+            # 先消除浮点误差，避免 36/12 这类整倍数被多进一箱
+            values = rounder((values / multiple).round(9)) * multiple
+
+        if spec['min'] is not None or spec['max'] is not None:
+            values = values.clip(lower=spec['min'], upper=spec['max'])
+        if spec['skip_negative']:
+            values = values.where(values >= 0)
+        result[spec['column']] = values
+    return result
+
+
+def uses_value_exprs(model_map):
+    """索引是否按目标值表达式计算：只有默认差值列时为 False
+
+    按列名判断，表达式的目标列即使就叫“所需数量”也按表达式的规则写入（空值不写）。
+    """
+    return tuple(getattr(model_map, 'columns', (LEGACY_VALUE_COLUMN,))) != (LEGACY_VALUE_COLUMN,)
+
+
+def target_headers(columns):
+    """ERP 索引各列对应的订单表目标列名"""
+    return [LEGACY_TARGET_HEADER if column == LEGACY_VALUE_COLUMN else column for column in columns]
+
+
+def find_header_columns(ws, headers, max_header_row, max_col=None):
+    """在订单表前 max_header_row 行（前 max_col 列）中查找各目标列，返回 {列名: 列号}，找不到的列不出现在结果中"""
+    found = {}
+    for row in ws.iter_rows(min_row=1, max_row=max_header_row, max_col=max_col):
+        for cell in row:
+            if not isinstance(cell.value, str):
+                continue
+            for header in headers:
+                if header not in found and header in cell.value:
+                    found[header] = cell.column
+    return found
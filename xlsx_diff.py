@@ -0,0 +1,442 @@
+"""xlsx 工作簿对比工具
+
+直接在 zip/XML 层面逐个部件、逐个单元格对比两个 .xlsx 文件，不经过 openpyxl 加载，
+用于验证处理后的文件只修改了预期的单元格，图片、绘图和样式保持不变。
+工作表按行的原始字节对比，只有字节不同的行才解析 XML，几十万行的表格也只需几秒。
+
+命令行用法：
+    python xlsx_diff.py 原文件.xlsx 处理后.xlsx [--limit 50] [--ignore-part 'docProps/*']
+"""
+import argparse
+import fnmatch
+import posixpath
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+
+# 这些部件的内容通过单元格值和样式做语义对比，或本身不影响表格内容
+DEFAULT_IGNORED_PARTS = (
+    'xl/sharedStrings.xml',
+    'xl/styles.xml',
+    'xl/calcChain.xml',
+    'docProps/*',
+)
+
+_CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _canonical(elem):
+    """去除命名空间、按属性名排序后序列化元素，用于比较XML是否等价"""
+    attrs = ' '.join(f'{_local(k)}="{v}"' for k, v in sorted(elem.attrib.items(), key=lambda kv: _local(kv[0])))
+    text = (elem.text or '').strip()
+    children = ''.join(_canonical(child) for child in elem)
+    return f'<{_local(elem.tag)} {attrs}>{text}{children}</{_local(elem.tag)}>'
+
+
+def _column_number(letters):
+    number = 0
+    for ch in letters:
+        number = number * 26 + ord(ch) - 64
+    return number
+
+
+def _column_letters(number):
+    letters = ''
+    while number:
+        number, rem = divmod(number - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def sheet_parts(zf):
+    """返回 {工作表名: 部件路径}"""
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {}
+    for rel in rels:
+        target = rel.get('Target')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join('xl', target))
+        targets[rel.get('Id')] = target
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    sheets = {}
+    for elem in workbook.iter():
+        if _local(elem.tag) == 'sheet':
+            rel_id = next(v for k, v in elem.attrib.items() if _local(k) == 'id')
+            sheets[elem.get('name')] = targets[rel_id]
+    return sheets
+
+
+def load_shared_strings(zf):
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    strings = []
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, elem in ET.iterparse(f):
+            if _local(elem.tag) == 'si':
+                # 忽略注音（rPh）部分，只拼接正文文本
+                parts = []
+                for child in elem:
+                    name = _local(child.tag)
+                    if name == 't':
+                        parts.append(child.text or '')
+                    elif name == 'r':
+                        parts.extend(t.text or '' for t in child if _local(t.tag) == 't')
+                strings.append(''.join(parts))
+                elem.clear()
+    return strings
+
+
+def load_cell_styles(zf):
+    """把 cellXfs 中每个样式索引展开成可比较的样式描述"""
+    if 'xl/styles.xml' not in zf.namelist():
+        return []
+    root = ET.fromstring(zf.read('xl/styles.xml'))
+    sections = {_local(child.tag): child for child in root}
+
+    num_formats = {}
+    if 'numFmts' in sections:
+        for fmt in sections['numFmts']:
+            num_formats[fmt.get('numFmtId')] = fmt.get('formatCode')
+
+    def canonical_list(name):
+        return [_canonical(child) for child in sections[name]] if name in sections else []
+
+    fonts = canonical_list('fonts')
+    fills = canonical_list('fills')
+    borders = canonical_list('borders')
+
+    def pick(items, index):
+        index = int(index or 0)
+        return items[index] if index < len(items) else None
+
+    styles = []
+    for xf in sections.get('cellXfs', []):
+        num_fmt_id = xf.get('numFmtId', '0')
+        extras = ''.join(_canonical(child) for child in xf)
+        styles.append((
+            num_formats.get(num_fmt_id, f'builtin:{num_fmt_id}'),
+            pick(fonts, xf.get('fontId')),
+            pick(fills, xf.get('fillId')),
+            pick(borders, xf.get('borderId')),
+            extras,
+        ))
+    return styles
+
+
+def _cell_value(cell, shared_strings):
+    cell_type = cell.get('t', 'n')
+    value = formula = None
+    for child in cell:
+        name = _local(child.tag)
+        if name == 'v':
+            value = child.text
+        elif name == 'f':
+            formula = child.text or ''
+        elif name == 'is':
+            value = ''.join(t.text or '' for t in child.iter() if _local(t.tag) == 't')
+    # 公式单元格只比较公式本身，缓存值在重新保存后可能被丢弃
+    if formula is not None:
+        return f'={formula}'
+    if value is None:
+        return None
+    if cell_type == 's':
+        return shared_strings[int(value)]
+    if cell_type == 'b':
+        return value == '1'
+    if cell_type == 'n':
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() else number
+    return value
+
+
+# 行的开始标签；rowBreaks 等以 row 开头的其他元素不会匹配
+_ROW_START = re.compile(rb'<(?:\w+:)?row[\s>/]')
+_SHEET_DATA_END = re.compile(rb'</(?:\w+:)?sheetData>')
+_ROW_NUMBER = re.compile(rb'\sr=["\'](\d+)')
+_ROOT_START = re.compile(rb'<(?:\w+:)?worksheet\b[^>]*>')
+_NAMESPACE_DECL = re.compile(rb'\sxmlns(?::\w+)?="[^"]*"')
+
+# 行元素上影响显示的属性：行高、隐藏、行样式、分级显示
+ROW_ATTRIBUTES = ('ht', 'customHeight', 'hidden', 's', 'customFormat', 'outlineLevel', 'collapsed',
+                  'thickTop', 'thickBot')
+
+_READ_SIZE = 4 * 1024 * 1024
+
+
+def split_sheet_rows(f, rest):
+    """按原始字节把工作表 XML 切成行，逐行产出 (行号, 行的字节)，不解析 XML
+
+    切分只用正则在字节上查找行的开始标签，耗时远低于逐个单元格解析。
+    第一行之前的部分（含根元素的命名空间声明）在产出第一行前追加到 rest 列表；
+    读完后再追加去掉全部行后的文档（列宽、合并单元格等工作表设置）。
+    """
+    buffer = b''
+    head = None
+    row_number = 0
+    eof = False
+    while not eof:
+        data = f.read(_READ_SIZE)
+        eof = not data
+        buffer += data
+        if head is None:
+            match = _ROW_START.search(buffer)
+            if match is None:
+                if eof:
+                    rest.append(buffer)
+                    return
+                continue
+            head, buffer = buffer[:match.start()], buffer[match.start():]
+            rest.append(head)
+
+        # buffer 总是从一行的开头开始，最后一行要等到下一行出现（或读到文件末尾）才算完整
+        bounds = [0] + [m.start() for m in _ROW_START.finditer(buffer, 1)]
+        tail = b''
+        if eof:
+            end = _SHEET_DATA_END.search(buffer, bounds[-1])
+            end = end.start() if end else len(buffer)
+            bounds.append(end)
+            tail = buffer[end:]
+        for begin, finish in zip(bounds, bounds[1:]):
+            segment = buffer[begin:finish]
+            number = _ROW_NUMBER.search(segment, 0, segment.find(b'>'))
+            row_number = int(number.group(1)) if number else row_number + 1
+            yield row_number, segment
+        buffer = buffer[bounds[-1]:]
+    rest.append(head + tail)
+
+
+def _walk_rows(rows_a, rows_b):
+    """按行号对齐两个行迭代器，缺失的一侧为 None"""
+    row_a = next(rows_a, None)
+    row_b = next(rows_b, None)
+    while row_a is not None or row_b is not None:
+        if row_b is None or (row_a is not None and row_a[0] < row_b[0]):
+            yield row_a[0], row_a[1], None
+            row_a = next(rows_a, None)
+        elif row_a is None or row_b[0] < row_a[0]:
+            yield row_b[0], None, row_b[1]
+            row_b = next(rows_b, None)
+        else:
+            yield row_a[0], row_a[1], row_b[1]
+            row_a = next(rows_a, None)
+            row_b = next(rows_b, None)
+
+
+class _SheetReader:
+    """解析单个工作表中字节不同的行，共享字符串和样式在第一次需要时才加载"""
+
+    def __init__(self, rest, tables):
+        self.rest = rest
+        self.tables = tables
+        self.wrapper = None
+
+    def parse_row(self, segment):
+        """返回 ({列号: (值, 样式)}, {行属性: 值})，样式已展开为可比较的描述"""
+        if segment is None:
+            return {}, {}
+        if self.wrapper is None:
+            # 行片段中带前缀的属性需要根元素上的命名空间声明才能解析
+            root = _ROOT_START.search(self.rest[0])
+            decls = b''.join(_NAMESPACE_DECL.findall(root.group(0))) if root else b''
+            self.wrapper = (b'<rows' + decls + b'>', b'</rows>')
+        shared_strings, styles = self.tables()
+        row = ET.fromstring(self.wrapper[0] + segment + self.wrapper[1])[0]
+
+        def style(index):
+            index = int(index or 0)
+            return styles[index] if index < len(styles) else None
+
+        cells = {}
+        col_number = 0
+        for cell in row:
+            ref = cell.get('r')
+            if ref:
+                col_number = _column_number(_CELL_REF.match(ref).group(1))
+            else:
+                col_number += 1
+            cells[col_number] = (_cell_value(cell, shared_strings), style(cell.get('s')))
+        attrs = {name: row.get(name) for name in ROW_ATTRIBUTES if row.get(name) is not None}
+        if 's' in attrs:
+            attrs['s'] = style(attrs['s'])
+        return cells, attrs
+
+
+def _layout(document):
+    """工作表中 sheetData 以外的顶层元素（列宽、合并单元格等），按元素名合并为可比较的文本"""
+    layout = {}
+    try:
+        root = ET.fromstring(document)
+    except ET.ParseError:
+        return {'(document)': document}
+    for elem in root:
+        name = _local(elem.tag)
+        if name != 'sheetData':
+            layout[name] = layout.get(name, '') + _canonical(elem)
+    return layout
+
+
+def _is_ignored(part, ignore_parts):
+    return any(fnmatch.fnmatch(part, pattern) for pattern in ignore_parts)
+
+
+def _xml_equal(data_a, data_b):
+    try:
+        return _canonical(ET.fromstring(data_a)) == _canonical(ET.fromstring(data_b))
+    except ET.ParseError:
+        return data_a == data_b
+
+
+def diff_workbooks(path_a, path_b, ignore_parts=DEFAULT_IGNORED_PARTS):
+    """对比两个 .xlsx 文件
+
+    返回字典：
+      cells   - [(工作表, 单元格, 原值, 新值)] 值不同的单元格
+      rows    - [(工作表, 行号)] 行高、隐藏、行样式等行属性的变化
+      styles  - [(工作表, 单元格)] 值相同但样式不同的单元格
+      layout  - [(工作表, 元素名)] 列宽、合并单元格等工作表级设置的变化
+      sheets  - [(工作表, 'added'/'removed')]
+      parts   - [(部件路径, 'added'/'removed'/'changed')] 工作表以外的部件（图片、绘图等）
+    """
+    report = {'cells': [], 'rows': [], 'styles': [], 'layout': [], 'sheets': [], 'parts': []}
+    with zipfile.ZipFile(path_a) as zf_a, zipfile.ZipFile(path_b) as zf_b:
+        sheets_a = sheet_parts(zf_a)
+        sheets_b = sheet_parts(zf_b)
+        infos_a = {info.filename: info for info in zf_a.infolist()}
+        infos_b = {info.filename: info for info in zf_b.infolist()}
+
+        def same_bytes(part):
+            info_a, info_b = infos_a.get(part), infos_b.get(part)
+            if info_a is None or info_b is None:
+                return info_a is info_b
+            return info_a.CRC == info_b.CRC and info_a.file_size == info_b.file_size
+
+        shared_same = same_bytes('xl/sharedStrings.xml') and same_bytes('xl/styles.xml')
+        tables = {}
+
+        def load_tables():
+            if not tables:
+                tables['a'] = (load_shared_strings(zf_a), load_cell_styles(zf_a))
+                tables['b'] = (load_shared_strings(zf_b), load_cell_styles(zf_b))
+                # 共享字符串和样式表语义相同（如只是重新压缩）时，字节相同的行也一定等价
+                tables['same'] = tables['a'] == tables['b']
+            return tables
+
+        for name in sheets_a.keys() - sheets_b.keys():
+            report['sheets'].append((name, 'removed'))
+        for name in sheets_b.keys() - sheets_a.keys():
+            report['sheets'].append((name, 'added'))
+
+        for name in [n for n in sheets_a if n in sheets_b]:
+            part_a, part_b = sheets_a[name], sheets_b[name]
+            # 工作表、共享字符串和样式都逐字节相同时无需解析
+            if part_a == part_b and shared_same and same_bytes(part_a):
+                continue
+            rows_same_when_bytes_same = shared_same or load_tables()['same']
+            rest_a, rest_b = [], []
+            reader_a = _SheetReader(rest_a, lambda: load_tables()['a'])
+            reader_b = _SheetReader(rest_b, lambda: load_tables()['b'])
+            with zf_a.open(part_a) as f_a, zf_b.open(part_b) as f_b:
+                rows = _walk_rows(split_sheet_rows(f_a, rest_a), split_sheet_rows(f_b, rest_b))
+                for row_number, segment_a, segment_b in rows:
+                    # 绝大多数行逐字节相同，只解析有差异的行
+                    if segment_a == segment_b and rows_same_when_bytes_same:
+                        continue
+                    cells_a, attrs_a = reader_a.parse_row(segment_a)
+                    cells_b, attrs_b = reader_b.parse_row(segment_b)
+                    if attrs_a != attrs_b:
+                        report['rows'].append((name, row_number))
+                    for col_number in sorted(cells_a.keys() | cells_b.keys()):
+                        value_a, style_a = cells_a.get(col_number, (None, None))
+                        value_b, style_b = cells_b.get(col_number, (None, None))
+                        ref = f'{_column_letters(col_number)}{row_number}'
+                        if value_a != value_b:
+                            report['cells'].append((name, ref, value_a, value_b))
+                        elif style_a != style_b:
+                            report['styles'].append((name, ref))
+
+            layout_a, layout_b = _layout(rest_a[-1]), _layout(rest_b[-1])
+            for tag in sorted(layout_a.keys() | layout_b.keys()):
+                if layout_a.get(tag) != layout_b.get(tag):
+                    report['layout'].append((name, tag))
+
+        skip = set(sheets_a.values()) | set(sheets_b.values())
+        for part in sorted(infos_a.keys() | infos_b.keys()):
+            if part in skip or part.endswith('/') or _is_ignored(part, ignore_parts):
+                continue
+            if part not in infos_b:
+                report['parts'].append((part, 'removed'))
+            elif part not in infos_a:
+                report['parts'].append((part, 'added'))
+            elif not same_bytes(part):
+                if part.endswith(('.xml', '.rels', '.vml')) and _xml_equal(zf_a.read(part), zf_b.read(part)):
+                    continue
+                report['parts'].append((part, 'changed'))
+    return report
+
+
+def assert_only_cells_changed(path_a, path_b, allowed, ignore_parts=DEFAULT_IGNORED_PARTS):
+    """测试辅助：断言两个文件只有允许的单元格值不同
+
+    allowed 为 {(工作表, 单元格)} 集合，或接收 (工作表, 单元格) 返回布尔值的函数。
+    样式、工作表设置和非工作表部件有任何变化都会断言失败。
+    """
+    is_allowed = allowed if callable(allowed) else (lambda sheet, ref: (sheet, ref) in allowed)
+    report = diff_workbooks(path_a, path_b, ignore_parts)
+    problems = [f'单元格 {sheet}!{ref}: {old!r} -> {new!r}'
+                for sheet, ref, old, new in report['cells'] if not is_allowed(sheet, ref)]
+    problems += [f'行属性 {sheet}!{row}' for sheet, row in report['rows']]
+    problems += [f'样式 {sheet}!{ref}' for sheet, ref in report['styles']]
+    problems += [f'工作表设置 {sheet}: {tag}' for sheet, tag in report['layout']]
+    problems += [f'工作表 {sheet}: {status}' for sheet, status in report['sheets']]
+    problems += [f'部件 {part}: {status}' for part, status in report['parts']]
+    if problems:
+        raise AssertionError('工作簿存在预期之外的差异:\n' + '\n'.join(problems[:50]))
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='对比两个xlsx文件的单元格、样式和部件差异')
+    parser.add_argument('file_a', help='原文件路径')
+    parser.add_argument('file_b', help='对比文件路径')
+    parser.add_argument('--limit', type=int, default=50, help='每类差异最多显示的条数')
+    parser.add_argument('--ignore-part', action='append', default=None,
+                        help='忽略的部件路径（支持通配符），可重复指定')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ignore_parts = DEFAULT_IGNORED_PARTS + tuple(args.ignore_part or ())
+    report = diff_workbooks(args.file_a, args.file_b, ignore_parts)
+
+    sections = [
+        ('cells', '单元格值变化', lambda item: f'{item[0]}!{item[1]}: {item[2]!r} -> {item[3]!r}'),
+        ('rows', '行属性变化', lambda item: f'{item[0]}!{item[1]}'),
+        ('styles', '单元格样式变化', lambda item: f'{item[0]}!{item[1]}'),
+        ('layout', '工作表设置变化', lambda item: f'{item[0]}: {item[1]}'),
+        ('sheets', '工作表增减', lambda item: f'{item[0]}: {item[1]}'),
+        ('parts', '其他部件变化', lambda item: f'{item[0]}: {item[1]}'),
+    ]
+    for key, title, fmt in sections:
+        items = report[key]
+        print(f'{title}: {len(items)}')
+        for item in items[:args.limit]:
+            print(f'  {fmt(item)}')
+        if len(items) > args.limit:
+            print(f'  ... 另有 {len(items) - args.limit} 条')
+
+    return 1 if any(report.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())